@@ -4,10 +4,21 @@ import os
 import importlib.util
 import sys
 import shutil
+import re
+import json
 from utils.logger import logger
-from config import PATHS
-import pkg_resources
-import subprocess
+from config import PATHS, LOG_ARCHIVE_CONFIG
+from utils.call_stats import call_stats
+from utils.metrics import metrics
+from utils.log_pipeline import log_pipeline
+from utils.log_reader import read_tail, normalize_levels, decode_line
+from utils.log_tailer import log_tailer
+from utils.output_capture import output_capture
+from utils.route_table import route_table
+from utils.dependency_installer import dependency_installer
+from utils.invoker import registry
+from utils.log_archive import ARCHIVE_SUFFIX, iter_archive_lines, read_archive_tail, search_archives
+from utils.startup_report import startup_report
 from typing import List, Union
 import mimetypes
 from pydantic import BaseModel
@@ -49,139 +60,26 @@ class FunctionManager:
 
     @staticmethod
     async def add_new_route(function_name: str):
-        """添加新路由，如果路由已存在则不添加"""
-        route_path = f"/function/{function_name}"
-        
+        """注册（或更新）函数路由，返回路由表是否有变化"""
         try:
-            # 读取现有路由
-            existing_routes = set()
-            if os.path.exists(PATHS["ROUTES_FILE"]):
-                with open(PATHS["ROUTES_FILE"], "r", encoding='utf-8') as f:
-                    existing_routes = {line.strip() for line in f if line.strip()}
-            
-            # 如果路由已存在，返回False
-            if route_path in existing_routes:
-                return False
-            
-            # 如果是新路由，添加到文件
-            with open(PATHS["ROUTES_FILE"], "a", encoding='utf-8') as f:
-                f.write(f"{route_path}\n")
-            
-            return True
-            
+            return route_table.sync(function_name)
         except Exception as e:
             logger.error(f"Error adding new route: {e}")
             return False
 
     @staticmethod
     async def clean_routes():
-        """清理不存在函数的路由"""
+        """路由表与 apps 目录重新对齐，移除不存在函数的路由"""
         try:
-            # 获取当前所有函数目录
-            apps_dir = PATHS["APPS_DIR"]
-            existing_functions = {
-                f"function/{item}" for item in os.listdir(apps_dir) 
-                if os.path.isdir(os.path.join(apps_dir, item)) and not item.startswith('__')
-            }
-            
-            # 读取现有路由
-            if os.path.exists(PATHS["ROUTES_FILE"]):
-                with open(PATHS["ROUTES_FILE"], "r", encoding='utf-8') as f:
-                    routes = {line.strip() for line in f if line.strip()}
-                
-                # 只保留存在的函数路由
-                valid_routes = {route for route in routes if route.split('/')[-1] in existing_functions}
-                
-                # 写回文件
-                with open(PATHS["ROUTES_FILE"], "w", encoding='utf-8') as f:
-                    for route in sorted(valid_routes):
-                        f.write(f"{route}\n")
-        
+            return route_table.rebuild()
         except Exception as e:
             logger.error(f"Error cleaning routes: {e}")
 
     @staticmethod
     async def check_and_install_dependencies():
-        """检查并安装所有函数的依赖"""
+        """检查所有函数的依赖：依赖文件未变化时直接返回，有新依赖时在后台批量安装"""
         try:
-            # 读取主requirements.txt
-            main_req_path = os.path.join(PATHS["BASE_DIR"], "requirements.txt")
-            main_requirements = set()
-            if os.path.exists(main_req_path):
-                with open(main_req_path, "r", encoding='utf-8') as f:
-                    for line in f:
-                        if line.strip() and not line.startswith('#'):
-                            # 提取包名和版本要求
-                            parts = line.strip().split('>=')
-                            if len(parts) > 1:
-                                main_requirements.add((parts[0], parts[1]))
-                            else:
-                                main_requirements.add((parts[0], None))
-            
-            # 检查每个函数的依赖
-            new_requirements = set()
-            conflict_requirements = set()
-            
-            apps_dir = PATHS["APPS_DIR"]
-            for item in os.listdir(apps_dir):
-                if os.path.isdir(os.path.join(apps_dir, item)) and not item.startswith('__'):
-                    req_path = os.path.join(apps_dir, item, "requirements.txt")
-                    if os.path.exists(req_path):
-                        with open(req_path, "r", encoding='utf-8') as f:
-                            for line in f:
-                                if line.strip() and not line.startswith('#'):
-                                    # 检查是否有版本要求
-                                    parts = line.strip().split('>=')
-                                    pkg_name = parts[0]
-                                    pkg_version = parts[1] if len(parts) > 1 else None
-                                    
-                                    # 检查是否在主依赖中
-                                    main_pkg = next((p for p in main_requirements if p[0] == pkg_name), None)
-                                    
-                                    if not main_pkg:
-                                        new_requirements.add((pkg_name, pkg_version))
-                                    elif pkg_version and main_pkg[1] and pkg_version > main_pkg[1]:
-                                        conflict_requirements.add((pkg_name, pkg_version, main_pkg[1]))
-            
-            result = {
-                "status": "success",
-                "message": "依赖环境检查完成",
-                "new_deps": [],
-                "conflicts": []
-            }
-            
-            # 处理冲突的依赖
-            if conflict_requirements:
-                conflict_msgs = []
-                for pkg, new_ver, old_ver in conflict_requirements:
-                    msg = f"{pkg}: 需要 >={new_ver}，但当前为 >={old_ver}"
-                    conflict_msgs.append(msg)
-                result["conflicts"] = conflict_msgs
-                result["status"] = "conflict"
-                result["message"] = "存在依赖冲突"
-            
-            # 安装新依赖
-            if new_requirements:
-                result["message"] = "正在安装新依赖..."
-                for pkg, version in new_requirements:
-                    req = f"{pkg}>={version}" if version else pkg
-                    try:
-                        subprocess.check_call(["pip", "install", req])
-                        result["new_deps"].append(req)
-                    except subprocess.CalledProcessError as e:
-                        result["status"] = "error"
-                        result["message"] = f"安装依赖 {req} 失败: {str(e)}"
-                        return result
-                
-                # 更新主requirements.txt
-                with open(main_req_path, "a", encoding='utf-8') as f:
-                    for pkg, version in new_requirements:
-                        f.write(f"\n{pkg}>={version}" if version else f"\n{pkg}")
-                
-                result["message"] = "新依赖安装完成"
-            
-            return result
-            
+            return await asyncio.to_thread(dependency_installer.ensure)
         except Exception as e:
             return {
                 "status": "error",
@@ -190,6 +88,31 @@ class FunctionManager:
                 "conflicts": []
             }
 
+@router.get("/dependencies")
+async def dependencies_status(tail: int = 200):
+    """依赖指纹是否与上次成功安装一致，以及最近一次安装任务的状态和输出"""
+    return await asyncio.to_thread(dependency_installer.status, tail)
+
+@router.post("/dependencies/install")
+async def dependencies_install(force: int = 0):
+    """重新检查依赖并在后台安装，force=1 时忽略上次失败的结果"""
+    return await asyncio.to_thread(dependency_installer.ensure, bool(force))
+
+@router.get("/startup")
+async def startup_info(top: int = None):
+    """启动耗时报告：各启动阶段、最慢的模块导入（累计/自身耗时）以及每个函数模块的加载耗时"""
+    return startup_report.to_dict(top)
+
+@router.get("/dependencies/wheelhouse")
+async def dependencies_wheelhouse():
+    """wheelhouse 中的 wheel 数量、占用空间以及每个函数用到的 wheel"""
+    return await asyncio.to_thread(dependency_installer.wheelhouse_info)
+
+@router.post("/dependencies/prune")
+async def dependencies_prune():
+    """删除所有函数都不再需要的 wheel"""
+    return await asyncio.to_thread(dependency_installer.prune)
+
 @router.get("/")
 async def admin_page(request: Request):
     return templates.TemplateResponse("sysinfo.html", {"request": request, "page": "sysinfo"})
@@ -261,10 +184,8 @@ async def upload_function(files: List[UploadFile] = File(...)):
                     detail=f"Error saving file {file.filename}: {str(e)}"
                 )
 
-        # 添加路由
-        route_path = f"/function/{function_name}"
-        with open(PATHS["ROUTES_FILE"], "a", encoding='utf-8') as f:
-            f.write(f"{route_path}\n")
+        # 注册路由
+        await FunctionManager.add_new_route(function_name)
         
         return {
             "status": "success", 
@@ -281,68 +202,12 @@ async def upload_function(files: List[UploadFile] = File(...)):
 @router.get("/refresh_functions")
 async def refresh_functions():
     try:
-        # 检查并安装新依赖
+        # 检查依赖，新依赖在后台安装
         new_deps = await FunctionManager.check_and_install_dependencies()
-        if new_deps:
-            logger.info(f"Installed new dependencies: {new_deps}")
-
-        # 获取当前所有函数
-        apps_dir = PATHS["APPS_DIR"]
-        new_routes = []
-        current_functions = set()
 
-        # 读取已存在的路由
-        existing_routes = set()
-        if os.path.exists(PATHS["ROUTES_FILE"]):
-            with open(PATHS["ROUTES_FILE"], "r") as f:
-                existing_routes = set(line.strip() for line in f)
-
-        # 扫描apps目录
-        for item in os.listdir(apps_dir):
-            if os.path.isdir(os.path.join(apps_dir, item)) and not item.startswith('__'):
-                current_functions.add(item)
-                route_path = f"/function/{item}"
-                
-                # 如果是新路由，添加到main.py
-                if route_path not in existing_routes:
-                    new_routes.append(route_path)
-                    
-                    # 检查函数是否需要filename参数
-                    module_path = os.path.join(apps_dir, item, "function.py")
-                    if os.path.exists(module_path):
-                        spec = importlib.util.spec_from_file_location(item, module_path)
-                        module = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(module)
-                        func = getattr(module, item)
-                        
-                        import inspect
-                        params = inspect.signature(func).parameters
-                        
-                        # 根据是否需要filename参数生成不同的路由代码
-                        if 'filename' in params:
-                            route_code = f'''
-@app.get("{route_path}")
-async def call_{item}(filename: str):
-    module = importlib.import_module("apps.{item}.function")
-    return module.{item}(filename)
-'''
-                        else:
-                            route_code = f'''
-@app.get("{route_path}")
-async def call_{item}():
-    module = importlib.import_module("apps.{item}.function")
-    return module.{item}()
-'''
-                        
-                        # 添加新路由到main.py
-                        with open("main.py", "a", encoding='utf-8') as f:
-                            f.write(route_code)
-
-        # 更新routes.txt
-        if new_routes:
-            with open(PATHS["ROUTES_FILE"], "w") as f:
-                for route in sorted(existing_routes.union(new_routes)):
-                    f.write(f"{route}\n")
+        # 路由表与 apps 目录对齐（不执行函数模块、不生成代码）
+        changes = await FunctionManager.clean_routes() or {"added": [], "removed": []}
+        new_routes = changes["added"]
 
         # 重新加载所有函数信息
         functions_info = await FunctionManager.load_function_info()
@@ -350,6 +215,7 @@ async def call_{item}():
         return {
             "status": "success",
             "new_routes": new_routes,
+            "removed_routes": changes["removed"],
             "new_dependencies": new_deps,
             "functions": functions_info
         }
@@ -428,7 +294,7 @@ async def save_function(function_name: str, files: dict):
         
         return {
             "status": "success",
-            "message": "函数保存成功" + ("，并安装了新依赖" if deps_result.get("new_deps") else "")
+            "message": "函数保存成功" + ("，新依赖正在后台安装" if deps_result.get("new_deps") else "")
         }
         
     except Exception as e:
@@ -474,10 +340,8 @@ async def create_function(data: dict):
         with open(readme_path, 'w', encoding='utf-8') as f:
             f.write('# 详细说明\n在这里补充函数的详细介绍、参数说明、返回值说明、使用示例等。\n')
         
-        # 添加路由
-        route_path = f"/function/{function_name}"
-        with open(PATHS["ROUTES_FILE"], "a", encoding='utf-8') as f:
-            f.write(f"{route_path}\n")
+        # 注册路由
+        await FunctionManager.add_new_route(function_name)
         
         # 检查并安装依赖
         deps_result = await FunctionManager.check_and_install_dependencies()
@@ -489,7 +353,7 @@ async def create_function(data: dict):
         
         return {
             "status": "success",
-            "message": "函数创建成功" + ("，并安装了新依赖" if deps_result.get("new_deps") else "")
+            "message": "函数创建成功" + ("，新依赖正在后台安装" if deps_result.get("new_deps") else "")
         }
         
     except HTTPException as e:
@@ -508,18 +372,9 @@ async def delete_function(function_name: str):
         # 删除函数目录
         shutil.rmtree(function_path)
         
-        # 从routes.txt中删除路由
-        if os.path.exists(PATHS["ROUTES_FILE"]):
-            with open(PATHS["ROUTES_FILE"], "r", encoding='utf-8') as f:
-                routes = [line.strip() for line in f if line.strip()]
-            
-            # 过滤掉要删除的路由
-            routes = [route for route in routes if not route.endswith(f"/{function_name}")]
-            
-            # 写回文件
-            with open(PATHS["ROUTES_FILE"], "w", encoding='utf-8') as f:
-                for route in routes:
-                    f.write(f"{route}\n")
+        # 从路由表中移除
+        route_table.sync(function_name)
+        registry.invalidate(function_name)
         
         return {
             "status": "success",
@@ -702,126 +557,141 @@ async def call_stats_page():
 
 @router.get("/call_stats_data")
 async def call_stats_data():
-    import json
-    stats_file = os.path.join(PATHS["BASE_DIR"], "call_stats.json")
-    if os.path.exists(stats_file):
-        with open(stats_file, "r", encoding="utf-8") as f:
-            stats = json.load(f)
-    else:
-        stats = {"total": 0, "functions": {}, "history_day": {}, "history_hour": {}}
-    # 取最近7天的天数据
-    today = datetime.now().date()
-    days = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-    history_day = {d: stats.get("history_day", {}).get(d, {}) for d in days}
-    # 取当天24小时数据
-    now = datetime.now()
-    day_str = now.strftime('%Y-%m-%d')
-    hours = [f"{day_str}-{str(h).zfill(2)}" for h in range(24)]
-    history_hour = {h: stats.get("history_hour", {}).get(h, {}) for h in hours}
-    return JSONResponse({
-        "total": stats.get("total", 0),
-        "functions": stats.get("functions", {}),
-        "history_day": history_day,
-        "history_hour": history_hour
-    })
+    # 直接使用内存中的统计数据（最近7天及当天24小时），附带各函数延迟指标
+    data = call_stats.summary()
+    data["latency"] = metrics.snapshot()
+    return JSONResponse(data)
+
+@router.get("/call_stats_query")
+async def call_stats_query(resolution: str = "hour", start: str = "", end: str = "", function: str = ""):
+    """
+    按时间范围查询调用历史。
+    resolution: minute / hour / day
+    start/end: 时间标签或其前缀，如 2024-01-01 或 2024-01-01-08，包含端点
+    function: 逗号分隔的函数名，为空表示全部函数
+    """
+    if resolution not in call_stats.history.retention_days:
+        raise HTTPException(status_code=400, detail=f"不支持的统计粒度: {resolution}")
+    functions = [f.strip() for f in function.split(",") if f.strip()]
+    history = call_stats.query(resolution, start or None, end or None, functions or None)
+    return JSONResponse({"resolution": resolution, "history": history})
 
 @router.get("/logs")
-async def get_logs(tail: int = 200, level: str = '', download: int = 0):
-    log_path = os.path.join(PATHS["LOGS_DIR"], "app.log")
-    if not os.path.exists(log_path):
-        return {"logs": ""}
-    # 兼容二进制日志
-    try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-    except UnicodeDecodeError:
-        with open(log_path, "rb") as f:
-            raw = f.read()
-        try:
-            lines = raw.decode("gbk").splitlines(keepends=True)
-        except Exception:
-            lines = raw.decode(errors="ignore").splitlines(keepends=True)
-    # 日志级别过滤
-    levels = [l.strip().lower() for l in level.split(",") if l.strip()]
-    if levels:
-        def match_level(line):
-            for lv in levels:
-                if f"[{lv.upper()}]" in line or f"[{lv.capitalize()}]" in line:
-                    return True
-            return False
-        lines = [l for l in lines if match_level(l)]
-    logs = "".join(lines[-tail:])
+async def get_logs(tail: int = 200, level: str = '', download: int = 0, before: int = -1, offset: int = 0, name: str = ''):
+    """
+    从文件末尾反向读取最后 tail 行，可按级别过滤（逗号分隔）。
+    before 为上一页返回的 cursor（游标分页），offset 为跳过最近的匹配行数（偏移分页），
+    name 为 logs 目录下的归档日志文件名，默认 app.log。
+    压缩归档（.log.gz）借助段索引只解压需要的段，cursor 为归档内的行号
+    """
+    log_name = os.path.basename(name) or "app.log"
+    log_path = os.path.join(PATHS["LOGS_DIR"], log_name)
+    if not os.path.isfile(log_path):
+        return {"logs": "", "cursor": 0, "has_more": False}
+    reader = read_archive_tail if log_name.endswith(ARCHIVE_SUFFIX) else read_tail
+    page = await asyncio.to_thread(
+        reader, log_path, tail, normalize_levels(level), before if before >= 0 else None, offset
+    )
+    logs = "".join(page["lines"])
     if download:
         from io import BytesIO
         buf = BytesIO(logs.encode("utf-8", errors="ignore"))
-        return StreamingResponse(buf, media_type="text/plain", headers={"Content-Disposition": "attachment; filename=app.log"})
-    return {"logs": logs}
+        return StreamingResponse(buf, media_type="text/plain", headers={"Content-Disposition": f"attachment; filename={log_name}"})
+    return {"logs": logs, "cursor": page["cursor"], "has_more": page["has_more"]}
+
+@router.get("/logs/pipeline")
+async def log_pipeline_stats():
+    """日志管道状态：队列长度、已写入行数、丢弃行数，以及实时日志推送的连接数"""
+    return {**log_pipeline.stats(), "stream": log_tailer.stats()}
 
 @router.websocket("/logs/stream")
 async def logs_stream(ws: WebSocket):
+    """实时日志：所有连接共用一个后台 tailer，新增日志经各自的有界队列推送"""
     await ws.accept()
-    log_path = os.path.join(PATHS["LOGS_DIR"], "app.log")
+    subscriber = None
     try:
-        last_size = 0
-        buffer = []
+        subscriber, snapshot = await log_tailer.subscribe()
+        if snapshot:
+            await ws.send_text(snapshot)
         while True:
-            if not os.path.exists(log_path):
-                await asyncio.sleep(1)
-                continue
-            try:
-                with open(log_path, "rb") as f:
-                    f.seek(0, 2)
-                    size = f.tell()
-                    if size < last_size:
-                        last_size = 0
-                        buffer = []
-                    if size > last_size:
-                        f.seek(last_size)
-                        data = f.read().decode("utf-8", errors="ignore")
-                        lines = data.splitlines(keepends=True)
-                        buffer.extend(lines)
-                        # Send lines individually or in chunks if needed
-                        await ws.send_text(''.join(lines)) # Sending as a single chunk
-                        last_size = size
-            except Exception:
-                # Handle exceptions during file reading or sending
-                pass # Continue loop on error
-            await asyncio.sleep(1)
+            await ws.send_text(await subscriber.get())
     except (WebSocketDisconnect, asyncio.CancelledError):
         # This block is executed when the WebSocket connection is closed
         logger.info("Log stream WebSocket disconnected or cancelled.") # Log on disconnection or cancellation
-        return
     except Exception as e:
         # Log any other unexpected exceptions
         logger.error(f"Log stream WebSocket error: {e}")
+    finally:
+        if subscriber is not None:
+            log_tailer.unsubscribe(subscriber)
+
+@router.get("/logs/function/{function_name}")
+async def get_function_output(function_name: str, n: int = 10):
+    """函数最近 n 次调用期间的 print / logging 输出（最新的在前）"""
+    return {"function": function_name, "invocations": output_capture.recent(function_name, n)}
 
 @router.get("/logs/list")
 async def list_logs():
     log_dir = PATHS["LOGS_DIR"]
     if not os.path.exists(log_dir):
         return {"logs": []}
-    files = [f for f in os.listdir(log_dir) if f.endswith('.log')]
+    files = [f for f in os.listdir(log_dir) if f.endswith('.log') or f.endswith(ARCHIVE_SUFFIX)]
     files.sort(reverse=True)
     return {"logs": files}
 
 @router.get("/logs/file")
-async def get_log_file(name: str):
+async def get_log_file(name: str, stream: int = 1):
+    """
+    以 text/plain 流式返回日志文件的全部内容，压缩归档边读边解压；
+    stream=0 时返回 {"logs": ...}，内容超过 FILE_JSON_MAX_BYTES 时返回 413，
+    此时请改用流式读取或分页接口 /admin/logs?name=
+    """
     log_dir = PATHS["LOGS_DIR"]
-    file_path = os.path.join(log_dir, name)
-    if not os.path.exists(file_path):
+    file_path = os.path.join(log_dir, os.path.basename(name))
+    if not os.path.isfile(file_path):
         return {"logs": ""}
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        with open(file_path, "rb") as f:
-            raw = f.read()
-        try:
-            content = raw.decode("gbk")
-        except Exception:
-            content = raw.decode(errors="ignore")
+    if stream:
+        return StreamingResponse(iter_archive_lines(file_path), media_type="text/plain; charset=utf-8")
+
+    def read_limited():
+        limit = LOG_ARCHIVE_CONFIG["FILE_JSON_MAX_BYTES"]
+        size = 0
+        lines = []
+        for raw in iter_archive_lines(file_path):
+            size += len(raw)
+            if size > limit:
+                return None
+            lines.append(decode_line(raw))
+        return "".join(lines)
+
+    content = await asyncio.to_thread(read_limited)
+    if content is None:
+        raise HTTPException(
+            status_code=413,
+            detail=f"日志文件超过 {LOG_ARCHIVE_CONFIG['FILE_JSON_MAX_BYTES']} 字节，请使用 stream=1 或分页接口 /admin/logs?name={os.path.basename(name)}"
+        )
     return {"logs": content}
 
+@router.get("/logs/search")
+async def search_logs(start: str = '', end: str = '', pattern: str = '', regex: int = 0, level: str = '', limit: int = 1000):
+    """
+    在 [start, end] 日期范围内的归档日志中搜索，以 NDJSON 流式返回匹配行，最后一行为汇总。
+    start / end 为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS；pattern 默认按不区分大小写的子串匹配，regex=1 时按正则匹配
+    """
+    compiled = None
+    if pattern:
+        try:
+            compiled = re.compile(pattern if regex else re.escape(pattern), re.IGNORECASE)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"无效的正则表达式: {e}")
+    limit = min(limit, LOG_ARCHIVE_CONFIG["SEARCH_LIMIT"]) if limit > 0 else LOG_ARCHIVE_CONFIG["SEARCH_LIMIT"]
+    matches = search_archives(PATHS["LOGS_DIR"], start, end, compiled, normalize_levels(level), limit)
+    # 同步生成器由 StreamingResponse 放到线程池中迭代，不阻塞事件循环
+    return StreamingResponse(
+        (json.dumps(item, ensure_ascii=False) + "\n" for item in matches),
+        media_type="application/x-ndjson"
+    )
+
 @router.get("/files_tree")
 async def files_tree():
     def walk_dir(path):
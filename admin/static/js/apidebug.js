@@ -4,23 +4,17 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentApi = null;
 
     async function loadApiConfigs() {
-        const res = await fetch('/functions');
+        // 一次请求获取所有函数的 config.json
+        const res = await fetch('/functions/metadata');
         if (!res.ok) return;
         const data = await res.json();
         if (!data.functions) return;
         allApiConfigs = [];
         for (const fn of data.functions) {
-            if (!fn.name) continue;
-            try {
-                const res2 = await fetch(`/admin/get_function_file_content/${fn.name}?file_path=config.json`);
-                if (!res2.ok) continue;
-                const conf = await res2.json();
-                if (conf && conf.content) {
-                    const cfg = JSON.parse(conf.content);
-                    cfg._funcname = fn.name;
-                    allApiConfigs.push(cfg);
-                }
-            } catch(e) {}
+            if (!fn.name || !fn.config) continue;
+            const cfg = Object.assign({}, fn.config);
+            cfg._funcname = fn.name;
+            allApiConfigs.push(cfg);
         }
         filteredApiConfigs = allApiConfigs;
         renderApiList();
@@ -379,12 +379,21 @@ document.addEventListener('DOMContentLoaded', function() {
         function render() {
             const descInput = document.getElementById('project-desc');
             const savedDesc = descInput ? descInput.value : '';
+            const kindSelect = document.getElementById('project-kind');
+            const savedKind = kindSelect ? kindSelect.value : 'sync';
             let html = `
                 <div class='file-create-dialog-title'>新建项目：${projectName}</div>
                 <div style='margin-bottom:18px;'>
                     <label style='font-weight:bold;font-size:20px;'>函数描述：</label><br>
                     <input id='project-desc' class='file-create-input' placeholder='输入函数描述' style='margin-top:10px;margin-bottom:0;' value='${savedDesc}'>
                 </div>
+                <div style='margin-bottom:18px;'>
+                    <label style='font-weight:bold;font-size:20px;'>函数类型：</label><br>
+                    <select id='project-kind' class='file-create-input' style='margin-top:10px;margin-bottom:0;background:#fff;'>
+                        <option value='sync' ${savedKind === 'sync' ? 'selected' : ''}>同步函数 (def)</option>
+                        <option value='async' ${savedKind === 'async' ? 'selected' : ''}>异步函数 (async def，适合 I/O 密集型)</option>
+                    </select>
+                </div>
                 <div style='margin-bottom:18px;'>
                     <label style='font-weight:bold;font-size:20px;'>输入参数：</label><br>
                     <div id='input-param-list'>
@@ -456,6 +465,7 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('project-create-btn').onclick = async () => {
                 syncParams();
                 const desc = document.getElementById('project-desc').value.trim();
+                const isAsync = document.getElementById('project-kind').value === 'async';
                 const inputList = inputParams.filter(p => p.name);
                 const outputList = outputParams.filter(p => p.name);
                 function genPyType(t) {
@@ -467,7 +477,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 const paramStr = inputList.map(p => `${p.name}: ${genPyType(p.type)}`).join(', ');
                 const docParams = inputList.map(p => `    ${p.name}: ${p.type}`).join('\n');
                 const docReturns = outputList.map(p => `    ${p.name}: ${p.type}`).join('\n');
-                const funcCode = `def ${projectName}(${paramStr}):\n    """\n    ${desc}\n    参数:\n${docParams}\n    返回:\n${docReturns}\n    """\n    # TODO: 实现你的业务逻辑\n    return {}`;
+                const funcCode = isAsync
+                    ? `import asyncio\n\n\nasync def ${projectName}(${paramStr}):\n    """\n    ${desc}\n    参数:\n${docParams}\n    返回:\n${docReturns}\n    """\n    # TODO: 实现你的业务逻辑，可使用 await 执行非阻塞 I/O\n    await asyncio.sleep(0)\n    return {}`
+                    : `def ${projectName}(${paramStr}):\n    """\n    ${desc}\n    参数:\n${docParams}\n    返回:\n${docReturns}\n    """\n    # TODO: 实现你的业务逻辑\n    return {}`;
                 const config = {
                     url: `/function/${projectName}`,
                     method: 'GET',
@@ -13,6 +13,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (res2.ok) {
                 const data = await res2.json();
                 totalCalls = data.total !== undefined ? data.total : '--';
+                renderLatency(data.latency || {});
             }
             document.getElementById('total-calls').textContent = totalCalls;
         } catch(e) {
@@ -20,5 +21,19 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('total-calls').textContent = '--';
         }
     }
+    function renderLatency(latency) {
+        const body = document.getElementById('latency-body');
+        body.innerHTML = '';
+        Object.keys(latency).sort().forEach(name => {
+            const m = latency[name];
+            const row = document.createElement('tr');
+            [name, m.count, m.errors, m.in_flight, m.p50_ms, m.p95_ms, m.p99_ms, m.max_ms].forEach(v => {
+                const td = document.createElement('td');
+                td.textContent = v;
+                row.appendChild(td);
+            });
+            body.appendChild(row);
+        });
+    }
     fetchStats();
 }); 
\ No newline at end of file
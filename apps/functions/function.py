@@ -1,6 +1,4 @@
-import os
-import json
-from config import PATHS
+from utils.function_catalog import catalog
 from fastapi import HTTPException
 
 def functions():
@@ -8,23 +6,7 @@ def functions():
     获取所有可用函数列表
     """
     try:
-        functions = []
-        apps_dir = PATHS["APPS_DIR"]
-        
-        for item in os.listdir(apps_dir):
-            if os.path.isdir(os.path.join(apps_dir, item)) and not item.startswith('__'):
-                config_path = os.path.join(apps_dir, item, 'config.json')
-                if os.path.exists(config_path):
-                    with open(config_path, 'r', encoding='utf-8') as f:
-                        config = json.load(f)
-                        functions.append({
-                            "name": item,
-                            "url": config["url"],
-                            "method": config["method"],
-                            "display_name": config.get("name", item),
-                            "parameters": config["parameters"]
-                        })
-        
-        return {"functions": functions}
+        # 与 GET /functions 共用内存函数目录
+        return {"functions": catalog.functions()}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,33 +1,75 @@
 import pandas as pd
 import random
 import os
+import threading
+from collections import OrderedDict
 
-def get_random_xlsx_line(filename: str):
+XLSX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xlsx_files")
+# 最多缓存的 (文件, 工作表, 列) 数量
+MAX_CACHED_COLUMNS = 32
+
+# (文件路径, 工作表, 列) -> (mtime_ns, size, 该列所有非空值)
+_column_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _parse_selector(value: str):
+    """数字字符串按位置索引处理，其余按名称处理"""
+    return int(value) if value.isdigit() else value
+
+
+def _load_column(file_path: str, sheet: str, column: str) -> list:
+    """
+    读取工作表中的一列并缓存，文件被替换（mtime 或大小变化）时重新读取
+    """
+    st = os.stat(file_path)
+    key = (file_path, sheet, column)
+    with _cache_lock:
+        cached = _column_cache.get(key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _column_cache.move_to_end(key)
+            return cached[2]
+
+    usecols = [_parse_selector(column)] if column else None
+    df = pd.read_excel(file_path, sheet_name=_parse_selector(sheet), usecols=usecols)
+    if len(df.columns) == 0:
+        raise ValueError("Excel文件格式不正确")
+    values = df.iloc[:, 0].dropna().tolist()
+
+    with _cache_lock:
+        _column_cache[key] = (st.st_mtime_ns, st.st_size, values)
+        _column_cache.move_to_end(key)
+        while len(_column_cache) > MAX_CACHED_COLUMNS:
+            _column_cache.popitem(last=False)
+    return values
+
+
+def get_random_xlsx_line(filename: str, sheet: str = "0", column: str = "", n: int = 1):
     """
-    从Excel文件中随机获取一行数据
-    
+    从Excel文件中随机获取数据
+
     Args:
         filename (str): Excel文件名
-    
+        sheet (str): 工作表名称或序号（从0开始），默认第一个工作表
+        column (str): 列名或序号（从0开始），默认第一列
+        n (int): 返回的不重复随机行数，默认1
+
     Returns:
-        dict: 包含随机行数据的字典
+        dict: n为1时 data 为单个值，否则为值列表
     """
     try:
-        file_path = os.path.join("apps", "get_random_xlsx_line", "xlsx_files", filename)
-        df = pd.read_excel(file_path)
-        
-        if df.empty:
+        file_path = os.path.join(XLSX_DIR, filename)
+        values = _load_column(file_path, sheet, column)
+
+        if not values:
             return {"error": "Excel文件为空"}
-            
-        # 获取随机行
-        random_row = df.iloc[random.randint(0, len(df)-1)]
-        
-        # 只返回题目内容（第一列）
-        if len(df.columns) > 0:
-            question = random_row[df.columns[0]]
-            return {"data": question}
-        else:
-            return {"error": "Excel文件格式不正确"}
-        
+        if n < 1:
+            return {"error": "n必须大于0"}
+
+        # 随机行（按位置随机访问，无需重新读取文件）
+        if n == 1:
+            return {"data": values[random.randrange(len(values))]}
+        return {"data": random.sample(values, min(n, len(values)))}
+
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
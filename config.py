@@ -1,33 +1,98 @@
 import os
 import logging
 from datetime import datetime
+from utils.log_rotation import get_rotator
 
 # 基础配置
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOGS_DIR, exist_ok=True)
 
-# 自定义日志轮转Handler（不再生成日期log，只保留最新1000行）
-class RotatingLineFileHandler(logging.FileHandler):
-    def __init__(self, filename, max_lines=1000, encoding=None):
-        super().__init__(filename, encoding=encoding)
+# app.log 保留的最新行数
+LOG_MAX_LINES = 1000
+
+# 自定义日志轮转Handler（不再生成日期log，只保留最新 max_lines 行）
+# 行数增量统计，超过 2 倍 max_lines 时原地截断，每条记录的轮转开销为均摊常数
+class RotatingLineFileHandler(logging.Handler):
+    def __init__(self, filename, max_lines=LOG_MAX_LINES, encoding=None):
+        super().__init__()
         self.filename = filename
         self.max_lines = max_lines
+        self.rotator = get_rotator(filename, max_lines)
 
     def emit(self, record):
-        super().emit(record)
-        self.rotate_if_needed()
-
-    def rotate_if_needed(self):
         try:
-            with open(self.filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            if len(lines) > self.max_lines:
-                # 只保留最新max_lines行，丢弃旧的
-                with open(self.filename, 'w', encoding='utf-8') as f:
-                    f.writelines(lines[-self.max_lines:])
-        except Exception as e:
-            print(f'Log rotation error: {e}')
+            msg = self.format(record)
+            self.rotator.write(msg + "\n")
+            self.rotator.flush()
+        except Exception:
+            self.handleError(record)
+
+# 日志管道配置（stdout/stderr 经队列由后台线程批量写入 app.log）
+LOG_PIPELINE_CONFIG = {
+    # 队列最多缓存的写入次数
+    "QUEUE_SIZE": 10000,
+    # 队列满时的策略：drop（丢弃并计数）/ block（阻塞写入方）
+    "POLICY": "drop",
+    # 单次批量写入的最大条数
+    "BATCH_SIZE": 512,
+    # 日志文件刷新间隔（秒），也决定实时日志推送的延迟上限
+    "FLUSH_INTERVAL": 0.05,
+    # 未刷新数据超过该字节数时立即刷新
+    "FLUSH_BYTES": 64 * 1024
+}
+
+# 按天归档配置（logs/YYYY-MM-DD.log.gz + 段索引 .idx）
+LOG_ARCHIVE_CONFIG = {
+    # 每个 gzip 段压缩前的大小（字节），搜索时以段为单位跳过
+    "SEGMENT_BYTES": 4 * 1024 * 1024,
+    "COMPRESS_LEVEL": 6,
+    # 单次搜索最多返回的匹配行数
+    "SEARCH_LIMIT": 10000,
+    # /admin/logs/file?stream=0 以 JSON 返回时允许的最大内容（解压后字节数），更大的文件请流式读取或分页
+    "FILE_JSON_MAX_BYTES": 1024 * 1024
+}
+
+# 函数调用输出收集配置（调用期间的 print / logging 输出按函数保存在内存环形缓冲中）
+OUTPUT_CAPTURE_CONFIG = {
+    "ENABLED": True,
+    # 每个函数保留最近多少次调用的输出
+    "INVOCATIONS": 20,
+    # 单次调用最多保留的输出字符数
+    "MAX_BYTES": 64 * 1024,
+    # 是否同时写入控制台和 app.log
+    "FORWARD_TO_LOG": False
+}
+
+# 实时日志推送配置（/admin/logs/stream，所有连接共用一个后台 tailer）
+LOG_STREAM_CONFIG = {
+    # 每个客户端最多缓存的待发送批次，超出时丢弃最旧的批次
+    "CLIENT_QUEUE_SIZE": 256,
+    # 单次读取的新增内容上限（字节）
+    "READ_CHUNK_BYTES": 256 * 1024,
+    # 连接建立时先发送的历史行数
+    "INITIAL_LINES": LOG_MAX_LINES,
+    # 文件系统通知不可用或遗漏时的兜底检查间隔（秒）
+    "POLL_INTERVAL": 1.0
+}
+
+# 启动配置
+STARTUP_CONFIG = {
+    # 统计启动期间各模块的导入耗时（GET /admin/startup 查看）
+    "IMPORT_REPORT": True,
+    # 报告中列出的最慢模块数
+    "REPORT_TOP": 20,
+    # 管理后台在首次访问或启动完成后的后台任务中才加载，不阻塞函数调用接口
+    "LAZY_ADMIN": True
+}
+
+# 启动预加载配置（config.json 中 "preload": true 或 {"warmup": [{参数}, ...]} 的函数）
+PRELOAD_CONFIG = {
+    # 同时导入/预热的函数数
+    "CONCURRENCY": 4,
+    # 单个函数预加载和预热的超时（秒），超时后不再阻塞就绪状态
+    "TIMEOUT": 120
+}
 
 # API配置
 API_CONFIG = {
@@ -36,6 +101,67 @@ API_CONFIG = {
     "DEBUG": True
 }
 
+# 函数执行配置
+EXECUTOR_CONFIG = {
+    # 默认执行方式：thread（线程池）/ process（进程池）/ worker（常驻warm进程池）/ inline（直接在事件循环中执行）
+    # 可在函数 config.json 中通过 "executor" 字段单独覆盖
+    "DEFAULT_MODE": "thread",
+    "THREAD_WORKERS": min(32, (os.cpu_count() or 1) + 4),
+    "PROCESS_WORKERS": os.cpu_count() or 1
+}
+
+# 常驻 warm worker 进程池配置（函数 config.json 中 "executor": "worker" 时使用）
+WORKER_POOL_CONFIG = {
+    "SIZE": os.cpu_count() or 1,
+    # 每个 worker 处理多少次调用后回收重启，0 表示不限制
+    "MAX_CALLS": 1000,
+    # worker 峰值内存超过该值（MB）后回收重启，0 表示不限制
+    "MAX_MEMORY_MB": 1024,
+    # worker 启动时预先导入的重量级模块
+    "PRELOAD_IMPORTS": ["numpy", "pandas"],
+    # 进程启动方式，None 表示使用平台默认（Linux 下为 fork）
+    "START_METHOD": None,
+    # 等待空闲 worker 的最长时间（秒），超时返回 503
+    "ACQUIRE_TIMEOUT": 30
+}
+
+# 批量调用配置（POST /functions/batch）
+BATCH_CONFIG = {
+    # 单次批量请求最多包含的调用数
+    "MAX_ITEMS": 1000,
+    # 单次批量请求内同时执行的调用数上限
+    "MAX_CONCURRENCY": 16
+}
+
+# 调用统计配置
+CALL_STATS_CONFIG = {
+    "FILE": os.path.join(BASE_DIR, "call_stats.json"),
+    # 按时间的调用历史（SQLite）
+    "HISTORY_DB": os.path.join(BASE_DIR, "call_history.db"),
+    # 内存统计写回磁盘的间隔（秒）
+    "FLUSH_INTERVAL": 5,
+    # 各粒度历史保留天数，None 表示永久保留；删除某个粒度即不再记录该粒度
+    "RETENTION_DAYS": {
+        "minute": 2,
+        "hour": 90,
+        "day": None
+    }
+}
+
+# 函数依赖安装配置
+DEPENDENCY_CONFIG = {
+    # 上次成功安装时依赖文件的指纹
+    "STATE_FILE": os.path.join(BASE_DIR, ".deps_state.json"),
+    # 每个安装任务保留的输出行数
+    "LOG_LINES": 500,
+    # 追加到 pip install 的参数，如 ["-i", "https://pypi.tuna.tsinghua.edu.cn/simple"]
+    "PIP_ARGS": [],
+    # 本地 wheel 目录，为 None 时直接从索引安装
+    "WHEELHOUSE_DIR": os.path.join(BASE_DIR, "wheelhouse"),
+    # 离线模式：只从 wheelhouse 安装，不访问网络
+    "OFFLINE": False
+}
+
 # 路径配置
 PATHS = {
     "BASE_DIR": BASE_DIR,
@@ -63,7 +189,7 @@ LOGGING = {
         "file": {
             "()": RotatingLineFileHandler,
             "filename": os.path.join(LOGS_DIR, "app.log"),
-            "max_lines": 1000,
+            "max_lines": LOG_MAX_LINES,
             "formatter": "default",
             "encoding": "utf-8"
         }
@@ -22,29 +22,38 @@ class AppReloader(FileSystemEventHandler):
         print("=== 服务器已启动 ===\n")
 
     def on_modified(self, event):
-        if event.src_path.endswith('.py') or event.src_path.endswith('.md'):
+        if self.needs_restart(event.src_path):
             print(f"\n检测到文件变化: {event.src_path}")
             self.start_app()
 
     def on_created(self, event):
-        if event.src_path.endswith('.py') or event.src_path.endswith('.md'):
+        if self.needs_restart(event.src_path):
             print(f"\n检测到新文件: {event.src_path}")
             self.start_app()
 
+    @staticmethod
+    def needs_restart(path):
+        # apps 目录下的函数由服务进程内热重载（utils/invoker.py），只有服务本身的代码变化才重启
+        if not path.endswith('.py'):
+            return False
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath('.'))
+        return not rel.startswith('apps' + os.sep)
+
 def main():
     # 创建观察者
     observer = Observer()
     event_handler = AppReloader()
     
-    # 监视apps目录
-    observer.schedule(event_handler, 'apps', recursive=True)
-    # 监视main.py
+    # 监视服务代码（apps 目录下的函数在服务进程内热重载，不触发重启）
     observer.schedule(event_handler, '.', recursive=False)
+    observer.schedule(event_handler, 'utils', recursive=True)
+    observer.schedule(event_handler, 'admin', recursive=True)
     
     observer.start()
     print("=== 热重载监视器已启动 ===")
-    print("监视目录: ./apps")
-    print("监视文件: ./main.py")
+    print("监视目录: ./utils, ./admin")
+    print("监视文件: ./*.py")
+    print("函数目录 ./apps 由服务进程内热重载")
     print("按Ctrl+C退出\n")
 
     try:
@@ -1,107 +1,123 @@
 import sys
 import os
 from datetime import datetime
-import re # Import re module for regex
-# ANSI escape code regex
-ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\\[0-?][ -/][@-~])')
-
-# Tee class to duplicate stdout/stderr
-class Tee(object):
-    def __init__(self, *files):
-        self.files = files
-        # Store original stdout/stderr to forward isatty() calls
-        self.original_stdout = sys.__stdout__ # Use sys.__stdout__ for the actual original stream
-        self.original_stderr = sys.__stderr__ # Use sys.__stderr__ for the actual original stream
-
-    def filter_ansi(self, text):
-        # More robust ANSI escape code removal
-        # Source: https://stackoverflow.com/questions/14693701/how-can-i-remove-the-ansi-escape-sequences-from-a-string-in-python
-        ansi_escape = re.compile(r'(\x1b[^m]*m)')
-        return ansi_escape.sub('', text)
-
-    def write(self, obj):
-        for f in self.files:
-            # If writing to the log file, filter ANSI codes
-            if f is log_file: # Directly check if it's the log file object
-                content_to_write = self.filter_ansi(obj)
-                # Ensure newlines for file logging consistency
-                if not content_to_write.endswith('\n'):
-                    content_to_write += '\n'
-            else:
-                content_to_write = obj
-            f.write(content_to_write)
-            f.flush()
-    def flush(self):
-        for f in self.files:
-            f.flush()
-    def isatty(self):
-        # Forward the isatty() call to the original stdout/stderr
-        # Check if original_stdout is a file-like object before calling isatty
-        if hasattr(self.original_stdout, 'isatty'):
-            return self.original_stdout.isatty()
-        return False # Default to False if not a proper terminal
+# 启动耗时报告：尽早开始统计后续模块的导入耗时
+from utils.startup_report import startup_report
+startup_report.track_imports()
 # 日志目录和文件
 log_dir = os.path.join(os.path.dirname(__file__), "logs")
 os.makedirs(log_dir, exist_ok=True)
 log_path = os.path.join(log_dir, "app.log")
 # 日志归档函数
 import threading, time
+from datetime import timedelta
+from config import LOG_MAX_LINES
+from utils.log_rotation import get_rotator
+from utils.log_archive import ArchiveWriter, archive_path
 
 def rotate_log_daily():
     while True:
         now = datetime.now()
-        next_day = datetime(now.year, now.month, now.day)  # 今天0点
-        next_day = next_day.replace(day=now.day+1) if now.hour >= 0 else next_day
+        next_day = datetime(now.year, now.month, now.day) + timedelta(days=1)  # 明天0点
         seconds = (next_day - now).total_seconds()
         time.sleep(seconds)
-        # 归档
-        archive_name = os.path.join(log_dir, now.strftime("%Y-%m-%d.log"))
-        if os.path.exists(log_path):
-            with open(log_path, "rb") as src, open(archive_name, "ab") as dst:
-                dst.write(src.read())
-            open(log_path, "w").close()  # 清空
-threading.Thread(target=rotate_log_daily, daemon=True).start()
-# Redirect stdout and stderr to both the log file and original stdout
-log_file = open(log_path, "a", encoding="utf-8", buffering=1)
-original_stdout = sys.stdout
-sys.stdout = Tee(original_stdout, log_file)
-sys.stderr = Tee(sys.stderr, log_file)
+        # 压缩分段归档（与日志写入、行数轮转共用同一把锁）
+        archive_name = archive_path(log_dir, now.strftime("%Y-%m-%d"))
+        get_rotator(log_path, LOG_MAX_LINES).archive(archive_name, ArchiveWriter(archive_name).write_from)
+# stdout/stderr 经由后台日志管道批量写入控制台和日志文件
+from utils.log_pipeline import log_pipeline
+log_pipeline.install(log_path)
 
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import time
 from utils.logger import logger
-from config import API_CONFIG, PATHS
-from admin.admin import router as admin_router, FunctionManager
+from config import API_CONFIG, PATHS, BATCH_CONFIG, STARTUP_CONFIG
+from utils.lazy_app import LazyRouterApp
+from utils.dependency_installer import dependency_installer
+from utils.invoker import registry
+from utils.executor import executor
+from utils.worker_pool import worker_pool
+from utils.call_stats import call_stats
+from utils.metrics import metrics
+from utils.result_cache import result_caches
+from utils.streaming import stream_response, choose_format
+from utils.output_capture import output_capture, follow
+from utils.function_catalog import catalog
+from utils.apps_watcher import apps_watcher
+from utils.route_table import route_table
+from utils.preloader import preloader
 import importlib
-from typing import List, Dict
+from typing import List, Dict, Any
+from pydantic import BaseModel
 import json
 import asyncio
 from datetime import datetime
 
-# 定义生命周期管理器
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # 启动时执行
+async def deferred_startup():
+    """
+    端口开始接受请求之后再执行的启动工作，各步骤都有按需的兜底：
+    函数目录未加载时按请求扫描，worker 进程池在首次调用时启动，管理后台在首次访问时加载
+    """
+    # 按天归档 app.log 的后台线程
+    threading.Thread(target=rotate_log_daily, daemon=True).start()
+    # 预加载并预热 config.json 中标记了 preload 的函数，与其余启动工作并行
+    preload = asyncio.create_task(preloader.run())
     try:
-        logger.info("Checking dependencies on startup...")
-        new_deps = await FunctionManager.check_and_install_dependencies()
-        if new_deps:
-            logger.info(f"Installed new dependencies on startup: {new_deps}")
+        # 依赖文件未变化时直接跳过，有新依赖时在后台安装
+        with startup_report.phase("dependencies", deferred=True):
+            deps_result = await asyncio.to_thread(dependency_installer.ensure)
+        if deps_result.get("new_deps"):
+            logger.info(f"Installing new dependencies in background: {deps_result['new_deps']}")
         else:
-            logger.info("No new dependencies needed")
+            logger.info(deps_result.get("message", "No new dependencies needed"))
     except Exception as e:
         logger.error(f"Error checking dependencies on startup: {e}")
-        raise e
+    try:
+        # 内存函数目录：全量扫描一次，之后由文件监控增量更新
+        with startup_report.phase("catalog", deferred=True):
+            await asyncio.to_thread(catalog.start)
+        # 预先启动常驻 worker 进程池，预加载 executor 为 worker 的函数模块
+        worker_functions = worker_pool.worker_functions()
+        if worker_functions:
+            with startup_report.phase("worker_pool", deferred=True):
+                await asyncio.to_thread(worker_pool.start, worker_functions)
+        if admin_app is not None and not admin_app.loaded:
+            with startup_report.phase("admin", deferred=True):
+                await asyncio.to_thread(admin_app.load)
+    except Exception as e:
+        logger.error(f"Error in deferred startup: {e}")
+    await preload
+    startup_report.finish()
+    logger.info(startup_report.summary())
+
+# 定义生命周期管理器
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时只做处理函数调用必需的工作，其余在开始接受请求后进行
+    with startup_report.phase("lifespan"):
+        call_stats.start()
+        # 路由表与 apps 目录对齐一次（只读 config.json），之后增量更新
+        route_table.start()
+        # 函数文件变化时在进程内重新编译并替换，无需重启服务
+        registry.watch()
+        apps_watcher.start()
+    startup_report.mark_ready()
+    deferred = asyncio.create_task(deferred_startup())
     
     yield  # 这里是应用运行的地方
     
-    # 关闭时执行（如果需要）
-    # 清理代码可以放在这里
+    # 关闭时执行
+    deferred.cancel()
+    apps_watcher.stop()
+    executor.shutdown(wait=False)
+    # 调用已加载函数的 shutdown()（worker 进程在退出前各自调用）
+    registry.shutdown_all()
+    call_stats.stop()
 
 # 使用生命周期管理器创建应用
 app = FastAPI(title="API Service", version="1.0.0", lifespan=lifespan)
@@ -142,98 +158,157 @@ async def global_exception_handler(request: Request, exc: Exception):
 # 静态文件
 app.mount("/static", StaticFiles(directory=PATHS["STATIC_DIR"]), name="static")
 
-# 路由
-app.include_router(admin_router, prefix="/admin")
+# 管理后台：按配置延迟到首次访问或启动完成后再导入
+if STARTUP_CONFIG["LAZY_ADMIN"]:
+    admin_app = LazyRouterApp(
+        "admin.admin", on_load=lambda sub_app: sub_app.add_exception_handler(Exception, global_exception_handler)
+    )
+    app.mount("/admin", admin_app)
+else:
+    from admin.admin import router as admin_router
+    app.include_router(admin_router, prefix="/admin")
+    admin_app = None
+
+def etag_response(request: Request, etag: str, body: bytes) -> Response:
+    """带 ETag 的 JSON 响应，If-None-Match 命中时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-# 获取函数列表的路由
+# 获取函数列表的路由（内存函数目录，由文件监控增量更新）
 @app.get("/functions")
-async def get_functions():
+async def get_functions(request: Request):
     try:
-        module = importlib.import_module("apps.functions.function")
-        return module.functions()
+        etag, body = catalog.encoded("functions")
+        return etag_response(request, etag, body)
     except Exception as e:
         logger.error(f"Error getting functions list: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 所有函数的 config.json、intro.md 和参数，一次返回
+@app.get("/functions/metadata")
+async def get_functions_metadata(request: Request):
+    try:
+        etag, body = catalog.encoded("metadata")
+        return etag_response(request, etag, body)
+    except Exception as e:
+        logger.error(f"Error getting functions metadata: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 就绪检查：预加载和预热完成后返回 200，之前返回 503
+@app.get("/ready")
+async def readiness():
+    status = preloader.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Prometheus 格式的指标
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+async def invoke_function(function_name: str, params, accept: str = None, request_id: str = None):
+    """
+    执行一次函数调用：获取调用器、转换参数、查询结果缓存、分发执行并统计，
+    供单次调用和批量调用共用。
+    生成器函数在 accept 不为 None 时返回流式响应（按 Accept 头选择 NDJSON 或 SSE），
+    否则收集为列表返回。
+    调用期间的输出按 request_id 收集到该函数的输出缓冲中
+    """
+    # 路由表查找为 O(1)，未注册的函数直接返回 404
+    if not route_table.has_function(function_name):
+        raise HTTPException(status_code=404, detail=f"Function not found: {function_name}")
+    # 从注册表获取已编译的调用器（文件变化时自动重新编译）并计为使用中，
+    # 调用结束前该版本不会因热重载执行 shutdown()
+    invoker = registry.acquire(function_name)
+    logger.info(f"Calling function: {function_name}")
+    
+    if invoker.is_stream and accept is not None:
+        with output_capture.capture(function_name, request_id) as output:
+            try:
+                kwargs = invoker.bind(params)
+            except BaseException:
+                invoker.release()
+                raise
+            items = executor.iterate(invoker, kwargs)
+            call_stats.record(function_name)
+            # 流式响应的延迟、in-flight 和错误在流结束时才记录；流结束时才释放该版本
+            items = metrics.track_stream(function_name, invoker.hold(follow(output, items)))
+            return stream_response(items, choose_format(invoker, accept), function_name)
+    
+    try:
+        # 记录延迟、错误数和正在执行的调用数
+        with metrics.track(function_name), output_capture.capture(function_name, request_id) as output:
+            # 按预先计算的参数计划转换参数
+            kwargs = invoker.bind(params)
+            
+            if invoker.is_stream:
+                result = [item async for item in executor.iterate(invoker, kwargs)]
+                call_stats.record(function_name)
+                return result
+            
+            # 启用了结果缓存的函数先查缓存
+            cache = result_caches.for_invoker(invoker)
+            hit = False
+            if cache is not None:
+                cache_key = cache.make_key(invoker, kwargs)
+                hit, result = cache.get(cache_key)
+                metrics.record_cache(function_name, hit)
+            
+            if not hit:
+                # 调用函数（按配置分发到线程池/进程池，不阻塞事件循环）
+                result = await executor.run(invoker, kwargs)
+                if cache is not None:
+                    cache.set(cache_key, result)
+    finally:
+        invoker.release()
+    
+    # 统计调用次数（内存累加，后台定期写回）
+    call_stats.record(function_name)
+    
+    return result
+
 # 动态函数调用
 @app.get("/function/{function_name}")
 async def call_function(function_name: str, request: Request):
     try:
-        module = importlib.import_module(f"apps.{function_name}.function")
-        func = getattr(module, function_name)
-        logger.info(f"Calling function: {function_name}")
-        
-        # 获取所有查询参数
-        query_params = dict(request.query_params)
-        
-        # 获取函数参数信息
-        import inspect
-        sig = inspect.signature(func)
-        
-        # 准备函数参数
-        kwargs = {}
-        for param_name, param in sig.parameters.items():
-            if param_name in query_params:
-                # 根据参数类型转换值
-                param_type = param.annotation if param.annotation != inspect.Parameter.empty else str
-                try:
-                    if param_type == float:
-                        kwargs[param_name] = float(query_params[param_name])
-                    elif param_type == int:
-                        kwargs[param_name] = int(query_params[param_name])
-                    else:
-                        kwargs[param_name] = query_params[param_name]
-                except ValueError as e:
-                    raise HTTPException(status_code=400, 
-                                     detail=f"Invalid value for parameter {param_name}: {str(e)}")
-            elif param.default == inspect.Parameter.empty:
-                # 如果参数没有默认值且未提供，则报错
-                raise HTTPException(status_code=400, 
-                                 detail=f"Missing required parameter: {param_name}")
-        
-        # 调用函数
-        result = func(**kwargs)
-        
-        # 统计调用次数（支持天/小时）
-        try:
-            now = datetime.now()
-            day_str = now.strftime('%Y-%m-%d')
-            hour_str = now.strftime('%Y-%m-%d-%H')
-            stats_file = os.path.join(PATHS["BASE_DIR"], "call_stats.json")
-            # 兼容旧数据结构
-            if os.path.exists(stats_file):
-                with open(stats_file, "r", encoding="utf-8") as f:
-                    stats = json.load(f)
-                if "history_day" not in stats or not isinstance(stats["history_day"], dict):
-                    stats["history_day"] = {}
-                if "history_hour" not in stats or not isinstance(stats["history_hour"], dict):
-                    stats["history_hour"] = {}
-            else:
-                stats = {"total": 0, "functions": {}, "history_day": {}, "history_hour": {}}
-            # 总数
-            stats["total"] = stats.get("total", 0) + 1
-            stats["functions"][function_name] = stats["functions"].get(function_name, 0) + 1
-            # 按天
-            if day_str not in stats["history_day"] or not isinstance(stats["history_day"][day_str], dict):
-                stats["history_day"][day_str] = {"total": 0}
-            stats["history_day"][day_str]["total"] = stats["history_day"][day_str].get("total", 0) + 1
-            stats["history_day"][day_str][function_name] = stats["history_day"][day_str].get(function_name, 0) + 1
-            # 按小时
-            if hour_str not in stats["history_hour"] or not isinstance(stats["history_hour"][hour_str], dict):
-                stats["history_hour"][hour_str] = {"total": 0}
-            stats["history_hour"][hour_str]["total"] = stats["history_hour"][hour_str].get("total", 0) + 1
-            stats["history_hour"][hour_str][function_name] = stats["history_hour"][hour_str].get(function_name, 0) + 1
-            with open(stats_file, "w", encoding="utf-8") as f:
-                json.dump(stats, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Error updating call stats: {e}")
-        
-        return result
-            
+        return await invoke_function(
+            function_name, request.query_params, request.headers.get("accept", ""), request.headers.get("x-request-id")
+        )
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error calling function {function_name}: {e}")
         raise HTTPException(status_code=404, detail=f"Function error: {str(e)}")
 
+class BatchItem(BaseModel):
+    function: str
+    params: Dict[str, Any] = {}
+
+# 批量函数调用
+@app.post("/functions/batch")
+async def call_functions_batch(items: List[BatchItem], concurrency: int = BATCH_CONFIG["MAX_CONCURRENCY"]):
+    """
+    一次请求执行多个函数调用，按并发上限并发执行，按请求顺序返回每一项的结果或错误
+    """
+    if len(items) > BATCH_CONFIG["MAX_ITEMS"]:
+        raise HTTPException(status_code=400, detail=f"Too many items, at most {BATCH_CONFIG['MAX_ITEMS']}")
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_CONFIG["MAX_CONCURRENCY"])))
+    
+    async def run_item(item: BatchItem):
+        async with semaphore:
+            try:
+                result = await invoke_function(item.function, item.params)
+                return {"function": item.function, "status": "success", "result": result}
+            except HTTPException as e:
+                return {"function": item.function, "status": "error", "status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                logger.error(f"Error calling function {item.function} in batch: {e}")
+                return {"function": item.function, "status": "error", "status_code": 404, "error": f"Function error: {str(e)}"}
+    
+    results = await asyncio.gather(*(run_item(item) for item in items))
+    return {"results": results}
+
 # 添加错误处理中间件
 @app.middleware("http")
 async def error_handling_middleware(request: Request, call_next):
@@ -254,5 +329,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",  # 修改为监听所有网络接口
         port=API_CONFIG["PORT"],
-        reload=API_CONFIG["DEBUG"]
+        reload=API_CONFIG["DEBUG"],
+        # apps 目录下的函数在进程内热重载，不触发整个服务重启
+        reload_excludes=[PATHS["APPS_DIR"]]
     )
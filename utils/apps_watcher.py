@@ -0,0 +1,99 @@
+import os
+import threading
+from config import PATHS
+from utils.logger import logger
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # 未安装 watchdog 时各订阅方退化为按需检查
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# 只有这些事件代表文件内容或目录结构变化；opened / closed 等读取事件会被忽略，
+# 否则重新编译时读取 config.json 本身又会触发下一次重新编译
+CHANGE_EVENTS = ("created", "modified", "deleted", "moved")
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if getattr(event, "event_type", None) not in CHANGE_EVENTS:
+            return
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                self.watcher.dispatch(path)
+
+
+class AppsWatcher:
+    """
+    apps 目录的共享文件监控：把每个文件事件映射为 (函数名, 文件名)，
+    分发给函数目录、调用器注册表等订阅方
+    """
+
+    def __init__(self, apps_dir: str):
+        self.apps_dir = os.path.abspath(apps_dir)
+        self._subscribers = []
+        self._observer = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._observer is not None
+
+    def subscribe(self, callback):
+        """callback(function_name, file_name)，file_name 为函数目录下的相对路径"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def function_name_for(self, path: str):
+        """返回 (函数名, 函数目录下的相对路径)，不在某个函数目录下时返回 (None, None)"""
+        rel = os.path.relpath(os.path.abspath(path), self.apps_dir)
+        if rel.startswith(".."):
+            return None, None
+        parts = rel.split(os.sep, 1)
+        if parts[0] in (".", "") or parts[0].startswith("__"):
+            return None, None
+        return parts[0], (parts[1] if len(parts) > 1 else "")
+
+    def dispatch(self, path: str):
+        name, file_name = self.function_name_for(path)
+        if not name or "__pycache__" in file_name:
+            return
+        for callback in list(self._subscribers):
+            try:
+                callback(name, file_name)
+            except Exception as e:
+                logger.error(f"Error handling change of {path}: {e}")
+
+    def start(self):
+        with self._lock:
+            if Observer is None or self._observer is not None:
+                return
+            try:
+                observer = Observer()
+                observer.schedule(_Handler(self), self.apps_dir, recursive=True)
+                observer.start()
+                self._observer = observer
+            except Exception as e:
+                logger.warning(f"Apps directory watcher unavailable: {e}")
+
+    def stop(self):
+        with self._lock:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer = None
+
+    def _after_fork(self):
+        """fork 出的子进程中没有监控线程，各订阅方需退化为按需检查文件"""
+        self._observer = None
+        self._lock = threading.Lock()
+
+
+apps_watcher = AppsWatcher(PATHS["APPS_DIR"])
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=apps_watcher._after_fork)
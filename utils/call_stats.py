@@ -0,0 +1,167 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from config import CALL_STATS_CONFIG
+from utils.logger import logger
+from utils.timeseries import CallHistoryStore, MINUTE_FORMAT, RESOLUTIONS
+
+# 过期数据清理间隔（秒）
+PRUNE_INTERVAL = 3600
+
+
+class CallStats:
+    """
+    内存中的调用统计聚合器。
+    每次调用只做常数次字典累加；总数和各函数调用数由后台线程定期（以及关闭时）
+    原子地写回 call_stats.json，按时间的调用历史写入 CallHistoryStore
+    """
+
+    def __init__(self, stats_file: str, history: CallHistoryStore, flush_interval: float):
+        self.stats_file = stats_file
+        self.history = history
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._total = 0
+        self._functions = {}
+        # 尚未写入历史存储的分钟级计数 {(分钟标签, 函数名): 次数}
+        self._pending = {}
+        self._dirty = False
+        self._last_prune = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.stats_file):
+            return
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading call stats: {e}")
+            return
+        self._total = data.get("total", 0)
+        if isinstance(data.get("functions"), dict):
+            self._functions = data["functions"]
+        # 兼容旧数据结构：将 history_day / history_hour 迁移到历史存储后从 json 中移除
+        legacy = False
+        for key, resolution in (("history_day", "day"), ("history_hour", "hour")):
+            if key in data:
+                legacy = True
+                if isinstance(data[key], dict) and resolution in self.history.retention_days:
+                    self.history.import_buckets(resolution, data[key])
+        if legacy:
+            self._dirty = True
+            self.flush()
+
+    def record(self, function_name: str, count: int = 1, now: datetime = None):
+        minute = (now or datetime.now()).strftime(MINUTE_FORMAT)
+        key = (minute, function_name)
+        with self._lock:
+            self._total += count
+            self._functions[function_name] = self._functions.get(function_name, 0) + count
+            self._pending[key] = self._pending.get(key, 0) + count
+            self._dirty = True
+
+    def query(self, resolution: str, start: str = None, end: str = None, functions: list = None) -> dict:
+        """查询调用历史，包含尚未写入存储的计数，参数含义见 CallHistoryStore.query"""
+        result = self.history.query(resolution, start, end, functions)
+        length = RESOLUTIONS[resolution]
+        with self._lock:
+            pending = list(self._pending.items())
+        for (minute, function_name), count in pending:
+            bucket = minute[:length]
+            if start and bucket < start:
+                continue
+            if end and bucket > end + "~":
+                continue
+            if functions and function_name not in functions:
+                continue
+            counts = result.setdefault(bucket, {"total": 0})
+            counts["total"] += count
+            counts[function_name] = counts.get(function_name, 0) + count
+        return dict(sorted(result.items()))
+
+    def summary(self, now: datetime = None) -> dict:
+        """返回总数、各函数调用数、最近7天及当天24小时的数据"""
+        now = now or datetime.now()
+        today = now.date()
+        days = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+        day_str = now.strftime('%Y-%m-%d')
+        hours = [f"{day_str}-{str(h).zfill(2)}" for h in range(24)]
+        history_day = self.query("day", days[0], days[-1])
+        history_hour = self.query("hour", day_str, day_str)
+        with self._lock:
+            total = self._total
+            functions = dict(self._functions)
+        return {
+            "total": total,
+            "functions": functions,
+            "history_day": {d: history_day.get(d, {}) for d in days},
+            "history_hour": {h: history_hour.get(h, {}) for h in hours}
+        }
+
+    def flush(self):
+        """如有变化，将历史计数写入时序存储，并原子地将总数写回磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            pending, self._pending = self._pending, {}
+            data = json.dumps(
+                {"total": self._total, "functions": self._functions},
+                ensure_ascii=False, indent=2
+            )
+            self._dirty = False
+        try:
+            self.history.add(pending)
+        except Exception as e:
+            # 写入失败时把计数放回，等待下次写入
+            with self._lock:
+                for key, count in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + count
+                self._dirty = True
+            logger.error(f"Error writing call history: {e}")
+        tmp_path = f"{self.stats_file}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.stats_file)
+        except Exception as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"Error flushing call stats: {e}")
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+            now = datetime.now().timestamp()
+            if now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                try:
+                    self.history.prune()
+                except Exception as e:
+                    logger.error(f"Error pruning call history: {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="call-stats-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+call_stats = CallStats(
+    CALL_STATS_CONFIG["FILE"],
+    CallHistoryStore(CALL_STATS_CONFIG["HISTORY_DB"], CALL_STATS_CONFIG["RETENTION_DAYS"]),
+    CALL_STATS_CONFIG["FLUSH_INTERVAL"]
+)
@@ -0,0 +1,387 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import hashlib
+import threading
+import tempfile
+import subprocess
+from collections import deque
+from urllib.parse import unquote
+from config import PATHS, DEPENDENCY_CONFIG
+from utils.logger import logger
+
+# 包名与版本要求，如 "pandas>=1.3.0"、"requests[socks]==2.31"
+REQUIREMENT = re.compile(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?\s*(.*?)\s*$')
+MIN_VERSION = re.compile(r'>=\s*([0-9][0-9A-Za-z.]*)')
+
+
+def normalize_name(name: str) -> str:
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_requirements(text: str) -> dict:
+    """解析 requirements 内容，返回 {规范化包名: 原始要求行}，忽略注释和 pip 选项"""
+    result = {}
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('-'):
+            continue
+        match = REQUIREMENT.match(line)
+        if match:
+            result[normalize_name(match.group(1))] = line
+    return result
+
+
+def _min_version(requirement: str):
+    match = MIN_VERSION.search(requirement)
+    if not match:
+        return None
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r'[.]', match.group(1)))
+
+
+def wheel_project(file_name: str) -> str:
+    """wheel 文件名中的项目名（规范化）"""
+    return normalize_name(file_name.split("-", 1)[0])
+
+
+class DependencyInstaller:
+    """
+    函数依赖安装器：对主 requirements.txt 和所有 apps/*/requirements.txt 的内容计算指纹，
+    与上次成功安装时的指纹相同则直接跳过；否则在后台线程中把所有新依赖合并为一次 pip install，
+    任务状态和输出可通过管理接口查看，调用方不会被 pip 阻塞。
+    启用 wheelhouse 时只从本地 wheel 目录安装（--no-index），缺少的 wheel 才下载或构建一次；
+    并记录每个函数用到的 wheel，用于清理不再需要的 wheel
+    """
+
+    def __init__(self, apps_dir: str, main_requirements: str, config: dict):
+        self.apps_dir = apps_dir
+        self.main_requirements = main_requirements
+        self.state_file = config.get("STATE_FILE")
+        self.log_lines = config.get("LOG_LINES", 500)
+        self.pip_args = list(config.get("PIP_ARGS", []))
+        self.wheelhouse = config.get("WHEELHOUSE_DIR")
+        self.offline = config.get("OFFLINE", False)
+        self.job = None
+        self._rerun = False
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def _read(self, path: str) -> str:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def function_requirements(self) -> dict:
+        """{函数名: requirements.txt 内容}"""
+        result = {}
+        if not os.path.isdir(self.apps_dir):
+            return result
+        for item in sorted(os.listdir(self.apps_dir)):
+            req_path = os.path.join(self.apps_dir, item, "requirements.txt")
+            if not item.startswith('__') and os.path.isfile(req_path):
+                result[item] = self._read(req_path)
+        return result
+
+    def fingerprint(self, function_reqs: dict = None) -> str:
+        digest = hashlib.sha256(self._read(self.main_requirements).encode("utf-8"))
+        for name, content in sorted((function_reqs if function_reqs is not None else self.function_requirements()).items()):
+            digest.update(b"\0" + name.encode("utf-8") + b"\0" + content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def plan(self, function_reqs: dict = None) -> dict:
+        """对比函数依赖与主依赖，返回新依赖、冲突以及每个新依赖由哪些函数需要"""
+        function_reqs = function_reqs if function_reqs is not None else self.function_requirements()
+        main = parse_requirements(self._read(self.main_requirements))
+        new, conflicts, required_by = {}, [], {}
+        for function_name, content in function_reqs.items():
+            for name, requirement in parse_requirements(content).items():
+                if name not in main:
+                    new.setdefault(name, requirement)
+                    required_by.setdefault(name, []).append(function_name)
+                    continue
+                wanted, current = _min_version(requirement), _min_version(main[name])
+                try:
+                    newer = wanted and current and wanted > current
+                except TypeError:
+                    newer = False
+                if newer:
+                    conflicts.append(f"{name}: 需要 {requirement}，但当前为 {main[name]}")
+        return {"new": new, "conflicts": sorted(set(conflicts)), "required_by": required_by}
+
+    def ensure(self, force: bool = False) -> dict:
+        """
+        依赖文件未变化时立即返回；有新依赖时启动（或排队）后台安装任务。
+        同一指纹安装失败后不再自动重试，force=True 时强制重新安装。
+        返回结构与原先的检查结果一致：status / message / new_deps / conflicts，另附任务信息
+        """
+        function_reqs = self.function_requirements()
+        fingerprint = self.fingerprint(function_reqs)
+        with self._lock:
+            if fingerprint == self._state.get("fingerprint"):
+                return self._result("success", "依赖未变化，跳过检查")
+            job = self.job
+            if not force and job is not None and job["status"] == "error" and job["fingerprint"] == fingerprint:
+                return self._result("error", f"依赖安装失败（退出码 {job['returncode']}），请查看安装日志")
+            plan = self.plan(function_reqs)
+            result_status = "conflict" if plan["conflicts"] else "success"
+            requirements = sorted(plan["new"].values())
+            if "fingerprint" not in self._state and self._wheels():
+                # 新节点或重建的容器：所有函数依赖都从 wheelhouse 离线安装
+                requirements = sorted(self._all_requirements(function_reqs).values())
+            if not requirements:
+                self._state["fingerprint"] = fingerprint
+                self._save_state()
+                return self._result(result_status, "存在依赖冲突" if plan["conflicts"] else "依赖环境检查完成",
+                                    conflicts=plan["conflicts"])
+            if self.job is not None and self.job["status"] == "running":
+                # 当前任务结束后按最新的依赖文件再检查一次
+                self._rerun = True
+                return self._result("pending", "已有依赖安装任务在进行，完成后将重新检查", conflicts=plan["conflicts"])
+            self.job = {
+                "id": uuid.uuid4().hex[:12],
+                "fingerprint": fingerprint,
+                "status": "running",
+                "requirements": requirements,
+                "new": sorted(plan["new"].values()),
+                "required_by": plan["required_by"],
+                "started": time.time(),
+                "finished": None,
+                "returncode": None,
+                "log": deque(maxlen=self.log_lines)
+            }
+            job = self.job
+        threading.Thread(target=self._run_job, args=(job, plan, function_reqs), name="dependency-installer", daemon=True).start()
+        return self._result("pending", "正在后台安装新依赖", new_deps=job["requirements"], conflicts=plan["conflicts"])
+
+    def _result(self, status: str, message: str, new_deps=None, conflicts=None) -> dict:
+        return {
+            "status": status,
+            "message": message,
+            "new_deps": new_deps or [],
+            "conflicts": conflicts or [],
+            "job": self.job_info(include_log=False)
+        }
+
+    def _log(self, job: dict, line: str):
+        job["log"].append(line.rstrip("\n"))
+
+    def _pip(self, job: dict, args: list) -> int:
+        """执行一次 pip 命令，输出逐行写入任务日志"""
+        cmd = [sys.executable, "-m", "pip"] + args
+        self._log(job, "$ " + " ".join(cmd))
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+        for line in process.stdout:
+            self._log(job, line)
+        return process.wait()
+
+    def _install(self, job: dict, requirements: list) -> int:
+        if not self.wheelhouse:
+            return self._pip(job, ["install"] + self.pip_args + requirements)
+        os.makedirs(self.wheelhouse, exist_ok=True)
+        local = ["--no-index", "--find-links", self.wheelhouse]
+        # 先只用本地 wheel 安装，全部命中时不访问网络
+        returncode = self._pip(job, ["install"] + local + requirements)
+        if returncode == 0 or self.offline:
+            return returncode
+        # 缺少的 wheel 下载或构建一次到 wheelhouse，再离线安装
+        self._log(job, "wheelhouse 中缺少部分 wheel，开始下载/构建")
+        returncode = self._pip(job, ["wheel", "--wheel-dir", self.wheelhouse, "--find-links", self.wheelhouse]
+                               + self.pip_args + requirements)
+        if returncode != 0:
+            return returncode
+        return self._pip(job, ["install"] + local + requirements)
+
+    def _all_requirements(self, function_reqs: dict = None) -> dict:
+        function_reqs = function_reqs if function_reqs is not None else self.function_requirements()
+        result = {}
+        for content in function_reqs.values():
+            for name, requirement in parse_requirements(content).items():
+                result.setdefault(name, requirement)
+        return result
+
+    def _wheels(self) -> list:
+        if not self.wheelhouse or not os.path.isdir(self.wheelhouse):
+            return []
+        return sorted(name for name in os.listdir(self.wheelhouse) if name.endswith(".whl"))
+
+    def _map_path(self) -> str:
+        return os.path.join(self.wheelhouse, "wheel_map.json")
+
+    def load_wheel_map(self) -> dict:
+        try:
+            with open(self._map_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"functions": {}}
+
+    def _resolve(self, job, requirements: list) -> dict:
+        """
+        用 pip 的安装报告（--dry-run --report）在 wheelhouse 内解析依赖闭包，
+        返回 {规范化项目名: (wheel 文件名, 依赖的项目名列表)}；pip 不支持时返回 None
+        """
+        fd, report_path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            args = ["install", "--dry-run", "--ignore-installed", "--no-index", "--find-links", self.wheelhouse,
+                    "--report", report_path, "--quiet"] + requirements
+            if self._pip(job, args) != 0:
+                return None
+            with open(report_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            return None
+        finally:
+            os.remove(report_path)
+        projects = {}
+        for item in report.get("install", []):
+            metadata = item.get("metadata", {})
+            url = item.get("download_info", {}).get("url", "")
+            requires = []
+            for dist in metadata.get("requires_dist") or []:
+                # 只跟随非 extra 的依赖
+                if "extra ==" in dist:
+                    continue
+                match = REQUIREMENT.match(dist.split(";", 1)[0])
+                if match:
+                    requires.append(normalize_name(match.group(1)))
+            projects[normalize_name(metadata.get("name", ""))] = (unquote(os.path.basename(url)), requires)
+        return projects
+
+    def update_wheel_map(self, job: dict = None) -> dict:
+        """重新计算每个函数需要的 wheel（含传递依赖）并写入 wheelhouse/wheel_map.json"""
+        job = job if job is not None else {"log": deque(maxlen=self.log_lines)}
+        function_reqs = {name: parse_requirements(content) for name, content in self.function_requirements().items()}
+        all_requirements = sorted({req for reqs in function_reqs.values() for req in reqs.values()})
+        wheels = self._wheels()
+        projects = self._resolve(job, all_requirements) if all_requirements else {}
+        mapping = {}
+        for function_name, reqs in function_reqs.items():
+            if projects is None:
+                # 无法解析依赖闭包时只记录直接依赖
+                mapping[function_name] = sorted(w for w in wheels if wheel_project(w) in reqs)
+                continue
+            needed, stack = set(), list(reqs)
+            while stack:
+                name = stack.pop()
+                if name in needed or name not in projects:
+                    continue
+                needed.add(name)
+                stack.extend(projects[name][1])
+            mapping[function_name] = sorted(projects[name][0] for name in needed if projects[name][0] in wheels)
+        # resolved 为 False 时映射只包含直接依赖，不能据此清理 wheel
+        wheel_map = {"updated": time.time(), "resolved": projects is not None, "functions": mapping}
+        tmp_path = self._map_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(wheel_map, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._map_path())
+        return wheel_map
+
+    def prune(self) -> dict:
+        """删除当前所有函数都不再需要的 wheel；无法解析完整依赖闭包时不删除任何 wheel"""
+        if not self.wheelhouse:
+            return {"removed": [], "freed_bytes": 0, "kept": 0}
+        wheel_map = self.update_wheel_map()
+        if not wheel_map["resolved"]:
+            # 只知道直接依赖时，pandas 依赖的 numpy 等传递依赖会被误删，离线安装随之失败
+            logger.warning("Wheelhouse prune skipped: could not resolve the full dependency closure")
+            return {"removed": [], "freed_bytes": 0, "kept": len(self._wheels()),
+                    "error": "无法解析完整的依赖关系（需要 pip >= 22.2 且 wheelhouse 中的 wheel 齐全），未清理任何 wheel"}
+        used = {wheel for wheels in wheel_map["functions"].values() for wheel in wheels}
+        removed, freed = [], 0
+        for wheel in self._wheels():
+            if wheel in used:
+                continue
+            path = os.path.join(self.wheelhouse, wheel)
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed.append(wheel)
+        if removed:
+            logger.info(f"Pruned {len(removed)} unused wheels from wheelhouse")
+        return {"removed": removed, "freed_bytes": freed, "kept": len(used)}
+
+    def wheelhouse_info(self) -> dict:
+        if not self.wheelhouse:
+            return {"dir": None, "offline": self.offline, "wheels": 0, "size_bytes": 0, "functions": {}}
+        wheels = self._wheels()
+        return {
+            "dir": self.wheelhouse,
+            "offline": self.offline,
+            "wheels": len(wheels),
+            "size_bytes": sum(os.path.getsize(os.path.join(self.wheelhouse, w)) for w in wheels),
+            "functions": self.load_wheel_map().get("functions", {})
+        }
+
+    def _run_job(self, job: dict, plan: dict, function_reqs: dict):
+        requirements = job["requirements"]
+        try:
+            returncode = self._install(job, requirements)
+        except Exception as e:
+            self._log(job, f"依赖安装出错: {e}")
+            returncode = -1
+        job["returncode"] = returncode
+        job["finished"] = time.time()
+        if returncode == 0:
+            # 新依赖记录到主 requirements.txt，之后的检查不再重复安装
+            with open(self.main_requirements, "a", encoding="utf-8") as f:
+                for requirement in job["new"]:
+                    f.write(f"\n{requirement}")
+            if self.wheelhouse:
+                try:
+                    self.update_wheel_map(job)
+                except Exception as e:
+                    logger.warning(f"Error updating wheelhouse map: {e}")
+            with self._lock:
+                # 按任务开始时读取的函数依赖计算指纹（主依赖已包含刚追加的内容），
+                # 任务期间新增或修改的 requirements.txt 会在随后的重新检查中被发现
+                self._state["fingerprint"] = self.fingerprint(function_reqs)
+                self._save_state()
+            job["status"] = "success"
+            logger.info(f"Installed new dependencies: {requirements}")
+        else:
+            job["status"] = "error"
+            logger.error(f"Dependency installation failed with exit code {returncode}: {requirements}")
+        with self._lock:
+            rerun, self._rerun = self._rerun, False
+        if rerun:
+            self.ensure()
+
+    def job_info(self, include_log: bool = True, tail: int = None) -> dict:
+        job = self.job
+        if job is None:
+            return None
+        info = {key: value for key, value in job.items() if key != "log"}
+        if include_log:
+            log = list(job["log"])
+            info["log"] = log[-tail:] if tail else log
+        return info
+
+    def status(self, tail: int = 200) -> dict:
+        fingerprint = self.fingerprint()
+        return {
+            "fingerprint": fingerprint,
+            "up_to_date": fingerprint == self._state.get("fingerprint"),
+            "job": self.job_info(tail=tail)
+        }
+
+
+dependency_installer = DependencyInstaller(
+    PATHS["APPS_DIR"], os.path.join(PATHS["BASE_DIR"], "requirements.txt"), DEPENDENCY_CONFIG
+)
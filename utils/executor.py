@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import threading
+import contextvars
+import multiprocessing.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import EXECUTOR_CONFIG
+from utils.logger import logger
+from utils.worker_pool import worker_pool
+
+EXECUTOR_MODES = ("thread", "process", "worker", "inline")
+
+# 进程池子进程退出时调用已加载函数的 shutdown()
+_process_finalizer = None
+
+
+def _run_in_process(function_name: str, kwargs: dict):
+    """在子进程中执行函数，子进程内使用自己的调用器注册表"""
+    global _process_finalizer
+    from utils.invoker import registry
+    if _process_finalizer is None:
+        _process_finalizer = multiprocessing.util.Finalize(registry, registry.shutdown_all, exitpriority=10)
+    return registry.get(function_name)(**kwargs)
+
+
+class FunctionExecutor:
+    """
+    函数执行层，将同步函数分发到有界线程池或进程池中执行，避免阻塞事件循环
+    """
+
+    def __init__(self, config: dict):
+        self.default_mode = config.get("DEFAULT_MODE", "thread")
+        self.thread_workers = config.get("THREAD_WORKERS")
+        self.process_workers = config.get("PROCESS_WORKERS")
+        self._thread_pool = None
+        self._process_pool = None
+        self._lock = threading.Lock()
+
+    def mode_for(self, invoker) -> str:
+        mode = invoker.config.get("executor", self.default_mode)
+        if mode not in EXECUTOR_MODES:
+            logger.warning(f"Unknown executor mode '{mode}' for {invoker.name}, using {self.default_mode}")
+            return self.default_mode
+        return mode
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            with self._lock:
+                if self._thread_pool is None:
+                    self._thread_pool = ThreadPoolExecutor(
+                        max_workers=self.thread_workers, thread_name_prefix="function"
+                    )
+        return self._thread_pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            with self._lock:
+                if self._process_pool is None:
+                    self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    async def run(self, invoker, kwargs: dict):
+        if invoker.is_async:
+            # 异步函数直接在事件循环中执行，I/O 等待期间不占用线程
+            return await invoker(**kwargs)
+        mode = self.mode_for(invoker)
+        if mode == "inline":
+            return invoker(**kwargs)
+        loop = asyncio.get_running_loop()
+        if mode == "process":
+            return await loop.run_in_executor(self.process_pool, _run_in_process, invoker.name, kwargs)
+        if mode == "worker":
+            return await loop.run_in_executor(
+                self.thread_pool, worker_pool.call, invoker.name, kwargs, invoker.fingerprint
+            )
+        # 复制当前上下文，使函数在线程中的输出仍归属到本次调用
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.thread_pool, functools.partial(ctx.run, invoker, **kwargs))
+
+    async def iterate(self, invoker, kwargs: dict):
+        """
+        逐项产出生成器函数的结果。异步生成器直接在事件循环中迭代；
+        同步生成器的每一步都在线程池中执行，只有消费方请求下一项时才继续生成
+        """
+        if invoker.is_async_gen:
+            async for item in invoker(**kwargs):
+                yield item
+            return
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        gen = await loop.run_in_executor(self.thread_pool, functools.partial(ctx.run, invoker, **kwargs))
+        done = object()
+        step = None
+        try:
+            while True:
+                step = self.thread_pool.submit(ctx.run, next, gen, done)
+                item = await asyncio.wrap_future(step)
+                if item is done:
+                    break
+                yield item
+        finally:
+            # 取消时线程中的 next(gen) 可能仍在执行，此时关闭会抛出 "generator already executing"，
+            # 先等待该步完成（取消只作用于等待方，线程中的这一步不会被中断），关闭同样在线程池中执行
+            if step is not None and not step.done():
+                try:
+                    await asyncio.shield(asyncio.wrap_future(step))
+                except Exception:
+                    pass
+            await loop.run_in_executor(self.thread_pool, ctx.run, gen.close)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown(wait=wait)
+                self._thread_pool = None
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=wait)
+                self._process_pool = None
+        worker_pool.shutdown()
+
+
+executor = FunctionExecutor(EXECUTOR_CONFIG)
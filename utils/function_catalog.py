@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import threading
+from config import PATHS
+from utils.logger import logger
+from utils.apps_watcher import apps_watcher
+
+# 影响函数元数据的文件
+METADATA_FILES = ("config.json", "intro.md")
+LISTING_KEYS = ("name", "url", "method", "display_name", "parameters")
+METADATA_KEYS = ("name", "display_name", "parameters", "config", "intro")
+
+
+class FunctionCatalog:
+    """
+    内存中的函数目录：启动时扫描一次 apps 目录，之后由文件监控按函数增量更新。
+    /functions 和批量元数据接口直接返回预先序列化的内容及其 ETag，读取开销与函数数量无关
+    """
+
+    def __init__(self, apps_dir: str):
+        self.apps_dir = os.path.abspath(apps_dir)
+        self._entries = {}
+        self._fingerprints = {}
+        self._encoded = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def _fingerprint(self, name: str):
+        result = []
+        for file_name in METADATA_FILES:
+            try:
+                st = os.stat(os.path.join(self.apps_dir, name, file_name))
+                result.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    def _load_entry(self, name: str):
+        function_dir = os.path.join(self.apps_dir, name)
+        with open(os.path.join(function_dir, "config.json"), "r", encoding="utf-8") as f:
+            config = json.load(f)
+        intro = ""
+        intro_path = os.path.join(function_dir, "intro.md")
+        if os.path.exists(intro_path):
+            with open(intro_path, "r", encoding="utf-8") as f:
+                intro = f.read()
+        return {
+            "name": name,
+            "url": config.get("url", f"/function/{name}"),
+            "method": config.get("method", "GET"),
+            "display_name": config.get("name", name),
+            "parameters": config.get("parameters", []),
+            "config": config,
+            "intro": intro
+        }
+
+    def refresh(self, name: str) -> bool:
+        """重新读取单个函数的元数据，有变化时返回 True"""
+        with self._lock:
+            fingerprint = self._fingerprint(name)
+            if not os.path.isdir(os.path.join(self.apps_dir, name)) or fingerprint[0] is None:
+                changed = self._entries.pop(name, None) is not None
+                self._fingerprints.pop(name, None)
+            elif self._fingerprints.get(name) == fingerprint:
+                return False
+            else:
+                try:
+                    self._entries[name] = self._load_entry(name)
+                except Exception as e:
+                    # config.json 正在写入或格式错误时先移出目录，下次变化时重新读取
+                    logger.warning(f"Error loading metadata for function {name}: {e}")
+                    self._entries.pop(name, None)
+                self._fingerprints[name] = fingerprint
+                changed = True
+            if changed:
+                self._encoded.clear()
+            return changed
+
+    def refresh_all(self):
+        with self._lock:
+            names = set()
+            if os.path.isdir(self.apps_dir):
+                names = {item for item in os.listdir(self.apps_dir)
+                         if not item.startswith("__") and os.path.isdir(os.path.join(self.apps_dir, item))}
+            for name in names | set(self._entries):
+                self.refresh(name)
+            self._loaded = True
+
+    def start(self):
+        """全量扫描一次，之后由 apps 目录监控按函数增量刷新"""
+        self.refresh_all()
+        apps_watcher.subscribe(self._on_change)
+
+    def _on_change(self, function_name: str, file_name: str):
+        self.refresh(function_name)
+
+    def _ensure_current(self):
+        # 没有文件监控时（未启动或在子进程中）退化为每次全量检查
+        if not self._loaded or not apps_watcher.running:
+            self.refresh_all()
+
+    def _select(self, keys: tuple) -> list:
+        with self._lock:
+            return [{key: entry[key] for key in keys} for _, entry in sorted(self._entries.items())]
+
+    def functions(self) -> list:
+        """函数列表（/functions 的格式）"""
+        self._ensure_current()
+        return self._select(LISTING_KEYS)
+
+    def metadata(self) -> list:
+        """所有函数的 config.json、intro.md 和参数"""
+        self._ensure_current()
+        return self._select(METADATA_KEYS)
+
+    def configs(self) -> dict:
+        """{函数名: config.json 内容}，供预加载、warm worker 等按配置筛选函数，无需重新扫描 apps 目录"""
+        self._ensure_current()
+        with self._lock:
+            return {name: entry["config"] for name, entry in sorted(self._entries.items())}
+
+    def encoded(self, kind: str):
+        """返回 (ETag, JSON 字节)，kind 为 functions 或 metadata；目录未变化时复用同一份序列化结果"""
+        self._ensure_current()
+        with self._lock:
+            cached = self._encoded.get(kind)
+            if cached is None:
+                data = self._select(LISTING_KEYS if kind == "functions" else METADATA_KEYS)
+                body = json.dumps({"functions": data}, ensure_ascii=False).encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                cached = self._encoded[kind] = (etag, body)
+            return cached
+
+
+catalog = FunctionCatalog(PATHS["APPS_DIR"])
@@ -0,0 +1,406 @@
+import os
+import sys
+import json
+import inspect
+import logging
+import importlib
+import importlib.util
+import time
+import threading
+from fastapi import HTTPException
+from config import PATHS
+from utils.logger import logger
+from utils.apps_watcher import apps_watcher
+from utils.startup_report import startup_report
+
+# 支持自动转换的参数类型，其余类型按原始字符串传入
+_CONVERTERS = {
+    float: float,
+    int: int,
+}
+
+# 函数入口中接收上下文对象的参数名，不从请求参数中绑定
+CONTEXT_PARAM = "ctx"
+
+
+class FunctionContext:
+    """
+    函数在当前进程内的上下文：init() 中创建的资源（DataFrame、正则、HTTP 会话、模型等）
+    以属性形式保存在上面，之后的每次调用通过入口函数的 ctx 参数取用，shutdown() 中释放
+    """
+
+    def __init__(self, name: str, function_dir: str, config: dict):
+        self.name = name
+        self.dir = function_dir
+        self.config = config
+        self.logger = logging.getLogger(f"apps.{name}")
+
+
+def _call_hook(hook, ctx: FunctionContext):
+    """调用 init / shutdown 钩子，钩子可以不接收参数"""
+    if inspect.signature(hook).parameters:
+        return hook(ctx)
+    return hook()
+
+
+class FunctionInvoker:
+    """
+    单个函数的已编译调用器：持有解析好的函数对象、config.json 内容、上下文对象，
+    以及预先计算好的参数转换/必填校验计划
+    """
+
+    def __init__(self, name: str, module, func, config: dict, fingerprint, context: FunctionContext = None):
+        self.name = name
+        self.module = module
+        self.func = func
+        self.config = config
+        self.fingerprint = fingerprint
+        self.context = context
+        self._shutdown_done = False
+        # 正在使用该版本的调用数；版本被替换（退役）后，最后一个调用结束时才执行 shutdown()
+        self._active = 0
+        self._retired = False
+        self._active_lock = threading.Lock()
+        # async def 函数直接在事件循环中 await，不进入线程池/进程池
+        self.is_async = inspect.iscoroutinefunction(func)
+        # 生成器/异步生成器函数以流式响应返回
+        self.is_async_gen = inspect.isasyncgenfunction(func)
+        self.is_stream = self.is_async_gen or inspect.isgeneratorfunction(func)
+        # 参数计划：(参数名, 转换函数或None, 是否必填)
+        self.plan = []
+        # 可选参数的默认值
+        self.defaults = {}
+        parameters = inspect.signature(func).parameters
+        # 入口函数声明了 ctx 参数时，每次调用传入该函数的上下文对象
+        self.wants_context = CONTEXT_PARAM in parameters
+        for param_name, param in parameters.items():
+            if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+                continue
+            if param_name == CONTEXT_PARAM:
+                continue
+            annotation = param.annotation if param.annotation is not inspect.Parameter.empty else str
+            self.plan.append((
+                param_name,
+                _CONVERTERS.get(annotation),
+                param.default is inspect.Parameter.empty
+            ))
+            if param.default is not inspect.Parameter.empty:
+                self.defaults[param_name] = param.default
+
+    def bind(self, query_params) -> dict:
+        """按参数计划把查询参数转换为函数关键字参数"""
+        kwargs = {}
+        for param_name, convert, required in self.plan:
+            if param_name in query_params:
+                value = query_params[param_name]
+                if convert is None:
+                    kwargs[param_name] = value
+                    continue
+                try:
+                    kwargs[param_name] = convert(value)
+                except ValueError as e:
+                    raise HTTPException(status_code=400,
+                                        detail=f"Invalid value for parameter {param_name}: {str(e)}")
+            elif required:
+                raise HTTPException(status_code=400,
+                                    detail=f"Missing required parameter: {param_name}")
+        return kwargs
+
+    def __call__(self, **kwargs):
+        if self.wants_context:
+            kwargs[CONTEXT_PARAM] = self.context
+        return self.func(**kwargs)
+
+    def _enter(self) -> bool:
+        """把一次调用计为使用中；版本已退役时返回 False，由调用方重新获取当前版本"""
+        with self._active_lock:
+            if self._retired:
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        """结束一次由 registry.acquire() 获取的调用，退役版本的最后一个调用结束时执行 shutdown()"""
+        with self._active_lock:
+            self._active -= 1
+            done = self._retired and self._active == 0
+        if done:
+            # 可能在事件循环中，shutdown() 放到后台线程执行
+            threading.Thread(target=self.shutdown, name=f"shutdown-{self.name}", daemon=True).start()
+
+    def hold(self, items):
+        """流式调用：流结束、被关闭或未被迭代就被回收时才释放本次调用"""
+        return _HeldStream(self, items)
+
+    def retire(self):
+        """版本已被替换或移除：没有进行中的调用时立即执行 shutdown()，否则等最后一个调用结束"""
+        with self._active_lock:
+            self._retired = True
+            done = self._active == 0
+        if done:
+            self.shutdown()
+
+    def shutdown(self):
+        """调用 function.py 中的 shutdown()（若有），每个调用器只执行一次"""
+        if self._shutdown_done:
+            return
+        self._shutdown_done = True
+        hook = getattr(self.module, "shutdown", None)
+        if not callable(hook):
+            return
+        try:
+            _call_hook(hook, self.context)
+            logger.info(f"Shut down function: {self.name}")
+        except Exception as e:
+            logger.error(f"Error in shutdown() of function {self.name}: {e}")
+
+
+class _HeldStream:
+    """包装流式调用的结果，只释放一次调用计数（流可能在开始迭代前就被丢弃）"""
+
+    def __init__(self, invoker: FunctionInvoker, items):
+        self.invoker = invoker
+        self.items = items
+        self._released = False
+        self._release_lock = threading.Lock()
+
+    def _release(self):
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        self.invoker.release()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.items.__anext__()
+        except BaseException:
+            # 包括 StopAsyncIteration：流已结束或出错
+            self._release()
+            raise
+
+    async def aclose(self):
+        try:
+            aclose = getattr(self.items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self._release()
+
+    def __del__(self):
+        self._release()
+
+
+class InvokerRegistry:
+    """
+    函数调用器注册表，每个函数只编译一次，
+    function.py、config.json 或同目录下的辅助模块发生变化时重新编译并原子替换。
+    新版本导入、校验或 init() 失败时继续使用旧版本；正在执行的调用持有旧的模块和函数对象，不受替换影响。
+    替换或移除后，旧版本上进行中的调用全部结束时调用其 shutdown()
+    """
+
+    WATCHED_FILES = ("function.py", "config.json")
+
+    def __init__(self, apps_dir: str):
+        self.apps_dir = apps_dir
+        self._invokers = {}
+        # 编译失败的版本指纹，避免每次调用都重试
+        self._failed = {}
+        # 每个函数一把编译锁，不同函数可以并行导入
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, function_name: str):
+        """
+        以被监视文件的 (mtime, size) 作为版本指纹，文件不存在时为 None；
+        最后一项为函数目录下其余 .py 文件（辅助模块）的 (相对路径, mtime, size)。
+        结果缓存和 worker 进程都以该指纹判断版本，辅助模块变化同样使其失效
+        """
+        function_dir = os.path.join(self.apps_dir, function_name)
+        parts = []
+        for file_name in self.WATCHED_FILES:
+            try:
+                st = os.stat(os.path.join(function_dir, file_name))
+                parts.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                parts.append(None)
+        helpers = []
+        for root, dirs, files in os.walk(function_dir):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                if not file_name.endswith(".py") or path == os.path.join(function_dir, "function.py"):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                helpers.append((os.path.relpath(path, function_dir), st.st_mtime_ns, st.st_size))
+        parts.append(tuple(sorted(helpers)))
+        return tuple(parts)
+
+    def _lock_for(self, function_name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._locks.get(function_name)
+            if lock is None:
+                lock = self._locks[function_name] = threading.Lock()
+            return lock
+
+    def _is_current(self, function_name: str, invoker: FunctionInvoker, fingerprint) -> bool:
+        return invoker is not None and (
+            invoker.fingerprint == fingerprint or self._failed.get(function_name) == fingerprint
+        )
+
+    def get(self, function_name: str) -> FunctionInvoker:
+        invoker = self._invokers.get(function_name)
+        if invoker is not None and apps_watcher.running:
+            # 文件监控负责在变化时重新编译，调用路径上无需检查文件
+            return invoker
+        fingerprint = self.fingerprint(function_name)
+        if self._is_current(function_name, invoker, fingerprint):
+            return invoker
+        with self._lock_for(function_name):
+            invoker = self._invokers.get(function_name)
+            if self._is_current(function_name, invoker, fingerprint):
+                return invoker
+            if fingerprint[0] is None:
+                removed = self._invokers.pop(function_name, None)
+                if removed is not None:
+                    removed.retire()
+                raise HTTPException(status_code=404, detail=f"Function not found: {function_name}")
+            return self._swap(function_name, fingerprint, invoker)
+
+    def acquire(self, function_name: str) -> FunctionInvoker:
+        """
+        获取调用器并计为使用中，结束后必须调用 release()（流式调用由 hold() 释放）。
+        获取与计数之间版本恰好被替换时重新获取，保证返回的版本在调用结束前不会执行 shutdown()
+        """
+        while True:
+            invoker = self.get(function_name)
+            if invoker._enter():
+                return invoker
+
+    def reload(self, function_name: str) -> bool:
+        """重新编译已加载的函数，成功替换时返回 True；指纹未变化时直接返回"""
+        with self._lock_for(function_name):
+            current = self._invokers.get(function_name)
+            if current is None:
+                return False
+            fingerprint = self.fingerprint(function_name)
+            if self._is_current(function_name, current, fingerprint):
+                return False
+            if fingerprint[0] is None:
+                self._invokers.pop(function_name, None)
+                logger.info(f"Function removed: {function_name}")
+                current.retire()
+                return False
+            return self._swap(function_name, fingerprint, current) is not current
+
+    def _swap(self, function_name: str, fingerprint, current: FunctionInvoker = None) -> FunctionInvoker:
+        try:
+            invoker = self._compile(function_name, fingerprint)
+        except Exception as e:
+            if current is None:
+                raise
+            self._failed[function_name] = fingerprint
+            logger.error(f"Reload of function {function_name} failed, keeping previous version: {e}")
+            return current
+        self._failed.pop(function_name, None)
+        self._invokers[function_name] = invoker
+        if current is not None:
+            # 新版本已生效，旧版本上进行中的调用结束后释放其在 init() 中创建的资源
+            current.retire()
+        return invoker
+
+    def invalidate(self, function_name: str = None):
+        """使指定函数（或全部函数）的调用器失效"""
+        with self._lock:
+            if function_name is None:
+                removed = list(self._invokers.values())
+                self._invokers.clear()
+                self._failed.clear()
+            else:
+                removed = [self._invokers.pop(function_name, None)]
+                self._failed.pop(function_name, None)
+        for invoker in removed:
+            if invoker is not None:
+                invoker.retire()
+
+    def _after_fork(self):
+        """
+        fork 出的子进程不沿用父进程的调用器：其中的资源属于父进程，
+        子进程按需重新编译并调用自己的 init()
+        """
+        self._invokers = {}
+        self._failed = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def shutdown_all(self):
+        """进程退出前调用所有已加载函数的 shutdown()"""
+        with self._lock:
+            invokers = list(self._invokers.values())
+        for invoker in invokers:
+            invoker.shutdown()
+
+    def watch(self):
+        """订阅 apps 目录监控，函数目录下的 .py 或 config.json 变化时立即重新编译"""
+        apps_watcher.subscribe(self._on_change)
+
+    def _on_change(self, function_name: str, file_name: str):
+        if file_name.endswith(".py") or file_name in ("", "config.json"):
+            self.reload(function_name)
+
+    def _compile(self, function_name: str, fingerprint) -> FunctionInvoker:
+        """
+        导入 function.py 的新模块对象（而非原地 reload），校验后再登记到 sys.modules；
+        失败时恢复原有模块
+        """
+        package = f"apps.{function_name}"
+        module_name = f"{package}.function"
+        path = os.path.join(self.apps_dir, function_name, "function.py")
+        importlib.invalidate_caches()
+        importlib.import_module(package)
+
+        # 同目录下的辅助模块也随之重新导入
+        saved = {key: mod for key, mod in sys.modules.items() if key.startswith(package + ".")}
+        for key in saved:
+            del sys.modules[key]
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            start = time.perf_counter()
+            spec.loader.exec_module(module)
+            startup_report.record_app(function_name, time.perf_counter() - start)
+            func = getattr(module, function_name, None)
+            if not callable(func):
+                raise AttributeError(f"function.py does not define a callable named {function_name}")
+
+            config = {}
+            config_path = os.path.join(self.apps_dir, function_name, "config.json")
+            if fingerprint[1] is not None:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+
+            # 每个进程（包括 worker 进程）在加载函数时调用一次 init()
+            context = FunctionContext(function_name, os.path.dirname(path), config)
+            hook = getattr(module, "init", None)
+            if callable(hook):
+                _call_hook(hook, context)
+            invoker = FunctionInvoker(function_name, module, func, config, fingerprint, context)
+        except BaseException:
+            for key in [key for key in sys.modules if key.startswith(package + ".")]:
+                del sys.modules[key]
+            sys.modules.update(saved)
+            raise
+
+        logger.info(f"Compiled invoker for function: {function_name}")
+        return invoker
+
+registry = InvokerRegistry(PATHS["APPS_DIR"])
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry._after_fork)
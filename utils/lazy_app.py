@@ -0,0 +1,44 @@
+import importlib
+import threading
+from utils.logger import logger
+
+
+class LazyRouterApp:
+    """
+    按需加载的 ASGI 子应用：挂载时不导入路由模块，首次请求（或启动完成后的后台任务）
+    才导入模块并用其中的 APIRouter 构建子应用，导入开销不计入启动时间
+    """
+
+    def __init__(self, module_name: str, attribute: str = "router", on_load=None):
+        self.module_name = module_name
+        self.attribute = attribute
+        self.on_load = on_load
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._app is not None
+
+    def load(self):
+        """导入路由模块并构建子应用，可在线程中调用，重复调用直接返回"""
+        if self._app is not None:
+            return self._app
+        with self._lock:
+            if self._app is None:
+                from fastapi import FastAPI
+                module = importlib.import_module(self.module_name)
+                app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+                app.include_router(getattr(module, self.attribute))
+                if self.on_load is not None:
+                    self.on_load(app)
+                self._app = app
+                logger.info(f"Loaded {self.module_name}")
+        return self._app
+
+    async def __call__(self, scope, receive, send):
+        app = self._app
+        if app is None:
+            # 后台预加载尚未完成时在当前请求中加载（导入锁保证只加载一次）
+            app = self.load()
+        await app(scope, receive, send)
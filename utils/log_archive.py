@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import zlib
+from config import LOG_ARCHIVE_CONFIG
+from utils.log_reader import line_level, decode_line
+from utils.log_rotation import READ_BLOCK_SIZE
+
+ARCHIVE_SUFFIX = ".log.gz"
+INDEX_SUFFIX = ".idx"
+
+# 压缩归档以及旧版未压缩的按天归档
+ARCHIVE_NAME = re.compile(r'^(\d{4}-\d{2}-\d{2})\.log(?:\.gz)?$')
+TIMESTAMP = re.compile(rb'^(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})')
+
+
+def archive_path(logs_dir: str, date: str) -> str:
+    return os.path.join(logs_dir, date + ARCHIVE_SUFFIX)
+
+
+def _line_timestamp(raw: bytes):
+    match = TIMESTAMP.match(raw)
+    return match.group(1).decode().replace("T", " ") if match else None
+
+
+class ArchiveWriter:
+    """
+    把日志内容追加到按天的压缩归档：每 SEGMENT_BYTES 为一个独立的 gzip 段（整个文件仍可直接 zcat），
+    每写完一段在旁路索引（.idx，每行一个 JSON）中追加该段的偏移、长度、行数、时间范围和各级别行数
+    """
+
+    def __init__(self, path: str, config: dict = LOG_ARCHIVE_CONFIG):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.segment_bytes = config.get("SEGMENT_BYTES", 4 * 1024 * 1024)
+        self.level = config.get("COMPRESS_LEVEL", 6)
+
+    def write_from(self, src):
+        """从二进制文件对象中流式读取并按段压缩写入，内存占用不超过一个段"""
+        buf = bytearray()
+        for block in iter(lambda: src.read(READ_BLOCK_SIZE), b""):
+            buf += block
+            while len(buf) >= self.segment_bytes:
+                # 段在行边界处切分
+                end = buf.rfind(b"\n", 0, self.segment_bytes) + 1 or self.segment_bytes
+                self._write_segment(bytes(buf[:end]))
+                del buf[:end]
+        if buf:
+            if not buf.endswith(b"\n"):
+                buf += b"\n"
+            self._write_segment(bytes(buf))
+
+    def _write_segment(self, data: bytes):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        compressed = compressor.compress(data) + compressor.flush()
+        entry = {"lines": 0, "first_ts": None, "last_ts": None, "levels": {}}
+        for raw in data.splitlines():
+            entry["lines"] += 1
+            ts = _line_timestamp(raw)
+            if ts:
+                entry["first_ts"] = entry["first_ts"] or ts
+                entry["last_ts"] = ts
+            level = line_level(raw)
+            if level:
+                entry["levels"][level] = entry["levels"].get(level, 0) + 1
+        with open(self.path, "ab") as f:
+            entry["offset"] = f.tell()
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        entry["length"] = len(compressed)
+        # 段写入完成后再写索引，中途崩溃只会留下未被索引的段
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def load_index(path: str) -> list:
+    """读取压缩归档的段索引；索引缺失时把整个文件视为一段"""
+    index_path = path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return [{"offset": 0, "length": os.path.getsize(path), "first_ts": None, "last_ts": None, "levels": None}]
+    segments = []
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                segments.append(json.loads(line))
+            except ValueError:
+                # 写入中断留下的半行
+                continue
+    return segments
+
+
+def _iter_segment_lines(f, offset: int, length: int):
+    """流式解压一个（或连续多个）gzip 段并逐行产出"""
+    f.seek(offset)
+    remaining = length
+    decompressor = zlib.decompressobj(31)
+    pending = b""
+    while remaining > 0:
+        chunk = f.read(min(READ_BLOCK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        while chunk:
+            pending += decompressor.decompress(chunk)
+            # 索引缺失时文件由多个 gzip 成员拼接而成，逐个解压
+            chunk = decompressor.unused_data
+            if decompressor.eof:
+                decompressor = zlib.decompressobj(31)
+            else:
+                chunk = b""
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for raw in lines:
+            yield raw + b"\n"
+    if pending:
+        yield pending
+
+
+def iter_archive_lines(path: str, segments: list = None):
+    """按顺序产出归档中的每一行，兼容旧版未压缩的 .log 归档"""
+    with open(path, "rb") as f:
+        if not path.endswith(ARCHIVE_SUFFIX):
+            yield from f
+            return
+        for segment in (segments if segments is not None else load_index(path)):
+            yield from _iter_segment_lines(f, segment["offset"], segment["length"])
+
+
+def read_archive_tail(path: str, tail: int = 200, levels: list = None, before: int = None, offset: int = 0) -> dict:
+    """
+    压缩归档的分页读取，返回结构与 log_reader.read_tail 相同。
+    cursor 为行号（归档内从 0 开始），下一页用 before=cursor 继续；
+    借助索引中每段的行数定位所需的段，按级别过滤时跳过没有该级别的段，只解压需要的段
+    """
+    segments = load_index(path)
+    starts, total = [], 0
+    for segment in segments:
+        starts.append(total)
+        total += segment.get("lines") or 0
+    if any(segment.get("lines") is None for segment in segments):
+        # 索引缺失或不完整（旧版归档）：无法按行号定位，整体解压一次
+        raw_lines = list(iter_archive_lines(path))
+        segments, starts, total = [None], [0], len(raw_lines)
+    before = total if before is None else min(before, total)
+    skip = max(0, offset)
+    found = []
+    with open(path, "rb") as f:
+        for i in range(len(segments) - 1, -1, -1):
+            segment, first = segments[i], starts[i]
+            if first >= before:
+                continue
+            if segment is not None and levels and not _segment_matches(segment, "", "", levels):
+                continue
+            lines = raw_lines if segment is None else list(
+                _iter_segment_lines(f, segment["offset"], segment["length"])
+            )
+            for n in range(min(len(lines), before - first) - 1, -1, -1):
+                if levels and line_level(lines[n]) not in levels:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                found.append((first + n, lines[n]))
+                # 多取一行用于判断是否还有更早的行
+                if len(found) > tail:
+                    break
+            if len(found) > tail:
+                break
+    has_more = len(found) > tail
+    found = found[:tail]
+    found.reverse()
+    return {
+        "lines": [decode_line(raw) for _, raw in found],
+        "cursor": found[0][0] if found else before,
+        "has_more": has_more
+    }
+
+
+def list_archives(logs_dir: str, start: str = "", end: str = "") -> list:
+    """返回日期在 [start, end] 内的归档 (日期, 路径)，同一天同时存在压缩和旧版归档时都返回"""
+    result = []
+    if not os.path.isdir(logs_dir):
+        return result
+    for name in os.listdir(logs_dir):
+        match = ARCHIVE_NAME.match(name)
+        if not match:
+            continue
+        date = match.group(1)
+        if (start and date < start[:10]) or (end and date > end[:10]):
+            continue
+        result.append((date, os.path.join(logs_dir, name)))
+    result.sort()
+    return result
+
+
+def _segment_matches(segment: dict, start: str, end: str, levels: list) -> bool:
+    if levels and segment.get("levels") is not None:
+        if not any(segment["levels"].get(level) for level in levels):
+            return False
+    if start and segment.get("last_ts") and segment["last_ts"] < start:
+        return False
+    if end and segment.get("first_ts") and segment["first_ts"] > end:
+        return False
+    return True
+
+
+def search_archives(logs_dir: str, start: str = "", end: str = "", pattern=None, levels: list = None, limit: int = 1000):
+    """
+    在日期范围内的归档中逐行搜索，产出 {"date", "line"}，最后产出一条汇总。
+    按索引中的时间范围和级别行数跳过不可能匹配的段，只解压需要扫描的段；
+    start / end 可以是日期或 "YYYY-MM-DD HH:MM:SS"，没有时间戳的行沿用上一行的时间
+    """
+    end_bound = end if len(end) > 10 else (end + " 99" if end else "")
+    matched = scanned = skipped = 0
+    for date, path in list_archives(logs_dir, start, end):
+        segments = load_index(path) if path.endswith(ARCHIVE_SUFFIX) else None
+        if segments is not None:
+            wanted = [s for s in segments if _segment_matches(s, start, end_bound, levels)]
+            skipped += len(segments) - len(wanted)
+            scanned += len(wanted)
+            segments = wanted
+        current_ts = date
+        for raw in iter_archive_lines(path, segments):
+            ts = _line_timestamp(raw)
+            if ts:
+                current_ts = ts
+            if start and current_ts < start:
+                continue
+            if end_bound and current_ts > end_bound:
+                continue
+            if levels and line_level(raw) not in levels:
+                continue
+            line = decode_line(raw).rstrip("\n")
+            if pattern is not None and not pattern.search(line):
+                continue
+            yield {"date": date, "line": line}
+            matched += 1
+            if limit and matched >= limit:
+                yield {"done": True, "matched": matched, "truncated": True,
+                       "scanned_segments": scanned, "skipped_segments": skipped}
+                return
+    yield {"done": True, "matched": matched, "truncated": False,
+           "scanned_segments": scanned, "skipped_segments": skipped}
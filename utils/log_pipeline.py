@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import time
+import queue
+import atexit
+import threading
+from config import LOG_PIPELINE_CONFIG, LOG_MAX_LINES
+from utils.log_rotation import get_rotator
+from utils.output_capture import current_capture
+
+# ANSI 转义序列（终端颜色等），写入日志文件前去除
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]')
+
+_STOP = object()
+
+
+class PipelineStream(object):
+    """
+    替换 sys.stdout / sys.stderr 的写入端：write() 只把文本放入队列，
+    由后台线程统一写入控制台和日志文件
+    """
+
+    def __init__(self, pipeline, console, name):
+        self.pipeline = pipeline
+        self.console = console
+        self.name = name
+
+    def write(self, text):
+        if not text:
+            return 0
+        output = current_capture.get()
+        if output is not None:
+            # 函数调用期间的输出归属到该次调用
+            output.write(self.name, text)
+            if not output.forward:
+                return len(text)
+        if os.getpid() != self.pipeline.pid:
+            # fork 出的子进程中没有写入线程，直接写控制台和日志文件
+            self.console.write(text)
+            self.pipeline.write_direct(text)
+            return len(text)
+        self.pipeline.put(self.console, text)
+        return len(text)
+
+    def flush(self):
+        # 刷新由后台写入线程负责，这里不阻塞调用方
+        pass
+
+    def isatty(self):
+        if hasattr(self.console, 'isatty'):
+            return self.console.isatty()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.console, name)
+
+
+class LogPipeline:
+    """
+    基于有界队列的日志管道：生产者只入队，单个后台线程批量写入控制台和 app.log，
+    写日志文件前过滤 ANSI 转义码，按时间间隔或字节数阈值刷新。
+    队列满时按策略丢弃（drop）或阻塞（block），并统计丢弃行数
+    """
+
+    def __init__(self, config: dict):
+        self.queue_size = config.get("QUEUE_SIZE", 10000)
+        self.policy = config.get("POLICY", "drop")
+        self.batch_size = config.get("BATCH_SIZE", 512)
+        self.flush_interval = config.get("FLUSH_INTERVAL", 0.2)
+        self.flush_bytes = config.get("FLUSH_BYTES", 64 * 1024)
+        self.pid = None
+        self.dropped_writes = 0
+        self.dropped_lines = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rotator = None
+        self._partial = ""
+
+    def install(self, log_path: str):
+        """打开日志文件，启动写入线程，并接管 sys.stdout / sys.stderr"""
+        if self._thread is not None:
+            return
+        self.pid = os.getpid()
+        # 与日志 Handler 共用同一个轮转器，写入和截断互斥
+        self._rotator = get_rotator(log_path, LOG_MAX_LINES)
+        self._thread = threading.Thread(target=self._run, name="log-pipeline", daemon=True)
+        self._thread.start()
+        sys.stdout = PipelineStream(self, sys.stdout, "stdout")
+        sys.stderr = PipelineStream(self, sys.stderr, "stderr")
+        atexit.register(self.stop)
+
+    def put(self, console, text: str):
+        try:
+            if self.policy == "block":
+                self._queue.put((console, text))
+            else:
+                self._queue.put_nowait((console, text))
+        except queue.Full:
+            with self._lock:
+                self.dropped_writes += 1
+                self.dropped_lines += text.count("\n")
+
+    def _run(self):
+        unflushed = 0
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            consoles = set()
+            texts = []
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                    continue
+                console, text = item
+                try:
+                    console.write(text)
+                    consoles.add(console)
+                except Exception:
+                    pass
+                texts.append(text)
+            if texts:
+                unflushed += self._write_file("".join(texts))
+            for console in consoles:
+                try:
+                    console.flush()
+                except Exception:
+                    pass
+            if unflushed and (stop or unflushed >= self.flush_bytes
+                              or time.monotonic() - last_flush >= self.flush_interval):
+                self._flush_file()
+                unflushed = 0
+                last_flush = time.monotonic()
+        if self._partial:
+            self._write_file("\n")
+        self._flush_file()
+
+    def write_direct(self, text: str):
+        """fork 出的子进程中同步写入日志文件（完整的行写入后立即刷新，子进程可能不经清理直接退出）"""
+        if self._rotator is None:
+            return
+        with self._lock:
+            if self._write_file(text):
+                self._flush_file()
+
+    def _after_fork(self):
+        # 父进程未写出的半行和可能被持有的锁不属于子进程
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def _write_file(self, text: str) -> int:
+        """只把完整的行写入日志文件，未结束的行留到下次"""
+        data = self._partial + ANSI_ESCAPE.sub('', text)
+        end = data.rfind("\n") + 1
+        self._partial = data[end:]
+        if not end:
+            return 0
+        try:
+            self._rotator.write(data[:end])
+        except Exception:
+            return 0
+        self.written += data.count("\n", 0, end)
+        return end
+
+    def _flush_file(self):
+        try:
+            self._rotator.flush()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "queued": self._queue.qsize(),
+            "written_lines": self.written,
+            "dropped_writes": self.dropped_writes,
+            "dropped_lines": self.dropped_lines
+        }
+
+    def stop(self, timeout: float = 5):
+        """写完队列中剩余的日志后停止写入线程"""
+        if self._thread is None or os.getpid() != self.pid:
+            return
+        # 之后的输出直接写控制台
+        for name in ("stdout", "stderr"):
+            stream = getattr(sys, name)
+            if isinstance(stream, PipelineStream) and stream.pipeline is self:
+                setattr(sys, name, stream.console)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+log_pipeline = LogPipeline(LOG_PIPELINE_CONFIG)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=log_pipeline._after_fork)
@@ -0,0 +1,173 @@
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from utils.log_rotation import READ_BLOCK_SIZE, truncation_state
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+# 兼容 "时间 - 名称 - INFO - 消息"、"[INFO]" 以及 uvicorn 的 "INFO:" 三种格式
+LEVEL_PATTERN = re.compile(
+    rb'(?:\[|- )(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL)(?:\]| -)|^(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL):',
+    re.IGNORECASE
+)
+
+
+def decode_line(raw: bytes) -> str:
+    """兼容 utf-8 / gbk 编码的日志行"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        try:
+            return raw.decode("gbk")
+        except UnicodeDecodeError:
+            return raw.decode("utf-8", errors="ignore")
+
+
+def line_level(raw: bytes):
+    match = LEVEL_PATTERN.search(raw)
+    if not match:
+        return None
+    level = (match.group(1) or match.group(2)).decode().upper()
+    return "WARNING" if level == "WARN" else level
+
+
+def normalize_levels(level: str) -> list:
+    """把逗号分隔的级别参数转换为标准级别列表"""
+    levels = []
+    for lv in level.split(","):
+        lv = lv.strip().upper()
+        if lv == "WARN":
+            lv = "WARNING"
+        if lv in LEVELS and lv not in levels:
+            levels.append(lv)
+    return levels
+
+
+def iter_lines_reverse(f, before: int):
+    """从 before 偏移处（行首）向前按块读取，逐行产出 (行起始偏移, 行内容)"""
+    pos = before
+    buf = b""
+    while pos > 0:
+        read_size = min(READ_BLOCK_SIZE, pos)
+        pos -= read_size
+        f.seek(pos)
+        buf = f.read(read_size) + buf
+        end = len(buf)
+        while True:
+            # 上一行的结尾换行符之后即为当前行的起始位置
+            idx = buf.rfind(b"\n", 0, end - 1)
+            if idx < 0:
+                break
+            yield pos + idx + 1, buf[idx + 1:end]
+            end = idx + 1
+        # 块开头可能是不完整的行，留到下一块拼接
+        buf = buf[:end]
+    if buf:
+        yield 0, buf
+
+
+class LevelIndex:
+    """
+    单个日志文件的级别偏移索引：记录每个级别的行起始偏移，
+    文件增长时只索引新增部分，文件被截断或替换时重建
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.identity = None
+        self.truncations = None
+        self.indexed_size = 0
+        self.offsets = {level: array("q") for level in LEVELS}
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        # 先取截断次数再 stat：两者之间发生的截断会在下次刷新时发现
+        truncations = truncation_state(self.path)[0]
+        st = os.stat(self.path)
+        identity = (st.st_dev, st.st_ino)
+        with self.lock:
+            # 原地截断后文件可能又增长超过已索引的大小，因此同时比较截断次数
+            if identity != self.identity or truncations != self.truncations or st.st_size < self.indexed_size:
+                self.identity = identity
+                self.truncations = truncations
+                self.indexed_size = 0
+                self.offsets = {level: array("q") for level in LEVELS}
+            if st.st_size == self.indexed_size:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self.indexed_size)
+                offset = self.indexed_size
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        # 未写完的行下次再索引
+                        break
+                    level = line_level(raw)
+                    if level:
+                        self.offsets[level].append(offset)
+                    offset += len(raw)
+                self.indexed_size = offset
+
+    def lines_before(self, levels: list, before: int, count: int) -> list:
+        """返回 before 之前最后 count 个匹配级别的行起始偏移（升序）"""
+        with self.lock:
+            candidates = []
+            for level in levels:
+                offsets = self.offsets[level]
+                end = bisect_left(offsets, before)
+                candidates.extend(offsets[max(0, end - count):end])
+        candidates.sort()
+        return candidates[-count:] if count else []
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(path: str) -> LevelIndex:
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LevelIndex(path)
+        return index
+
+
+def read_tail(path: str, tail: int = 200, levels: list = None, before: int = None, offset: int = 0) -> dict:
+    """
+    读取日志文件末尾（或 before 偏移之前）的 tail 行，可按级别过滤。
+    从文件末尾按块反向读取，耗时只与 tail 有关而与文件大小无关；按级别过滤时使用级别偏移索引。
+    offset 表示跳过最近的 offset 条匹配行（偏移分页）。
+    返回 {"lines": [...], "cursor": 本页第一行的字节偏移, "has_more": 是否还有更早的行}，
+    下一页可用 before=cursor 继续读取（游标分页）
+    """
+    size = os.path.getsize(path)
+    before = size if before is None or before < 0 or before > size else before
+    want = max(0, tail) + max(0, offset)
+    result = []
+    cursor = before
+    with open(path, "rb") as f:
+        if levels:
+            index = _get_index(path)
+            index.refresh()
+            # 索引只覆盖到最后一个完整行
+            before = min(before, index.indexed_size)
+            cursor = before
+            for line_offset in reversed(index.lines_before(levels, before, want)):
+                f.seek(line_offset)
+                result.append((line_offset, f.readline()))
+        else:
+            for line_offset, raw in iter_lines_reverse(f, before):
+                result.append((line_offset, raw))
+                if len(result) >= want:
+                    break
+    page = result[offset:offset + tail] if offset else result[:tail]
+    if page:
+        cursor = page[-1][0]
+    page.reverse()
+    return {
+        "lines": [decode_line(raw) for _, raw in page],
+        "cursor": cursor,
+        "has_more": cursor > 0 and len(result) >= want
+    }
@@ -0,0 +1,158 @@
+import os
+import shutil
+import threading
+
+# 反向读取文件时每次读取的块大小
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def tail_offset(f, lines: int) -> int:
+    """从文件末尾向前按块读取，返回最后 lines 行的起始字节偏移"""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    if lines <= 0:
+        return pos
+    end = pos
+    found = 0
+    while pos > 0:
+        read_size = min(READ_BLOCK_SIZE, pos)
+        pos -= read_size
+        f.seek(pos)
+        block = f.read(read_size)
+        # 文件末尾的换行符属于最后一行
+        if pos + read_size == end and block.endswith(b"\n"):
+            block = block[:-1]
+        idx = len(block)
+        while True:
+            idx = block.rfind(b"\n", 0, idx)
+            if idx < 0:
+                break
+            found += 1
+            if found == lines:
+                return pos + idx + 1
+    return 0
+
+
+class LogRotator:
+    """
+    单个日志文件的写入与轮转。
+    增量记录文件的行数和字节数，超过 2 倍 max_lines（或 max_bytes）时原地截断为最后 max_lines 行，
+    每条记录的轮转开销为均摊常数；所有写入、截断和按天归档共用同一把锁
+    """
+
+    def __init__(self, path: str, max_lines: int = 1000, max_bytes: int = 0, encoding: str = "utf-8"):
+        self.path = path
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.lock = threading.RLock()
+        self._file = None
+        self.lines = 0
+        self.size = 0
+        # 原地截断（轮转或归档清空）的次数及最近一次截断后的文件大小。
+        # 截断后文件可能很快又超过原来的大小，读取方不能只靠文件变小来判断
+        self.truncations = 0
+        self.truncated_size = 0
+        self._open()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "ab")
+        # 只在启动时统计一次已有内容
+        self.lines = 0
+        with open(self.path, "rb") as f:
+            for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+                self.lines += block.count(b"\n")
+        self.size = os.path.getsize(self.path)
+
+    def write(self, text: str):
+        data = text.encode(self.encoding, errors="replace")
+        with self.lock:
+            self._file.write(data)
+            self.lines += data.count(b"\n")
+            self.size += len(data)
+            if self.lines > self.max_lines * 2 or (self.max_bytes and self.size > self.max_bytes):
+                self._truncate()
+
+    def flush(self):
+        with self.lock:
+            self._file.flush()
+
+    def _truncate(self):
+        """原地保留最后 max_lines 行（其他以追加模式打开的句柄不受影响）"""
+        self._file.flush()
+        with open(self.path, "r+b") as f:
+            start = tail_offset(f, self.max_lines)
+            f.seek(start)
+            tail = f.read()
+            f.seek(0)
+            f.write(tail)
+            f.truncate()
+        self.lines = tail.count(b"\n")
+        self.size = len(tail)
+        self.truncated_size = self.size
+        self.truncations += 1
+
+    def archive(self, archive_path: str, writer=None):
+        """
+        把当前日志内容追加到归档文件并清空日志。
+        writer(src) 用于自定义归档格式（如压缩分段），未指定时原样追加到 archive_path
+        """
+        with self.lock:
+            self._file.flush()
+            with open(self.path, "rb") as src:
+                if writer is not None:
+                    writer(src)
+                else:
+                    with open(archive_path, "ab") as dst:
+                        shutil.copyfileobj(src, dst)
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
+            self.lines = 0
+            self.size = 0
+            self.truncated_size = 0
+            self.truncations += 1
+
+
+_rotators = {}
+_rotators_lock = threading.Lock()
+
+
+def get_rotator(path: str, max_lines: int = 1000, max_bytes: int = 0) -> LogRotator:
+    """同一文件在进程内共用一个 LogRotator"""
+    path = os.path.abspath(path)
+    with _rotators_lock:
+        rotator = _rotators.get(path)
+        if rotator is None:
+            rotator = _rotators[path] = LogRotator(path, max_lines, max_bytes)
+        return rotator
+
+
+def truncation_state(path: str):
+    """
+    返回 (截断次数, 最近一次截断后的大小)；该文件在本进程内没有 LogRotator 时返回 (0, 0)，
+    此时读取方只能依据文件大小变小来判断截断
+    """
+    rotator = _rotators.get(os.path.abspath(path))
+    if rotator is None:
+        return 0, 0
+    return rotator.truncations, rotator.truncated_size
+
+
+# 子进程继承的文件对象：其缓冲区中是父进程尚未写出的数据，保留引用使其不在子进程中被刷新（否则会重复写入）
+_inherited_files = []
+
+
+def _reset_locks_after_fork():
+    # fork 时锁可能正被其他线程持有，子进程中重新创建；子进程使用自己的文件句柄写入
+    for rotator in _rotators.values():
+        rotator.lock = threading.RLock()
+        _inherited_files.append(rotator._file)
+        try:
+            rotator._file = open(rotator.path, "ab")
+        except OSError:
+            pass
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
@@ -0,0 +1,193 @@
+import os
+import asyncio
+import threading
+from config import LOG_STREAM_CONFIG, PATHS
+from utils.log_reader import read_tail, decode_line
+from utils.log_rotation import truncation_state
+from utils.logger import logger
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # 未安装 watchdog 时退化为按 POLL_INTERVAL 轮询
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _LogFileHandler(FileSystemEventHandler):
+    """只关心目标日志文件的变化，收到通知后唤醒 tailer 线程"""
+
+    def __init__(self, path: str, wakeup: threading.Event):
+        self.path = path
+        self.wakeup = wakeup
+
+    def on_any_event(self, event):
+        paths = (getattr(event, "src_path", None), getattr(event, "dest_path", None))
+        if any(p and os.path.abspath(p) == self.path for p in paths):
+            self.wakeup.set()
+
+
+class LogSubscriber:
+    """
+    单个实时日志客户端：有界队列，客户端读取过慢时丢弃最旧的批次并记录丢弃行数，
+    下次发送时提示客户端
+    """
+
+    def __init__(self, queue_size: int, generation: int, position: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # 历史日志截止的位置（文件截断后失效），此前的内容不再推送
+        self.generation = generation
+        self.position = position
+        self.dropped_lines = 0
+
+    def push(self, generation: int, start: int, text: str):
+        if generation == self.generation and start < self.position:
+            return
+        if self.queue.full():
+            dropped = self.queue.get_nowait()
+            self.dropped_lines += dropped.count("\n")
+        self.queue.put_nowait(text)
+
+    async def get(self) -> str:
+        text = await self.queue.get()
+        if self.dropped_lines:
+            text = f"... 客户端读取过慢，已丢弃 {self.dropped_lines} 行日志 ...\n" + text
+            self.dropped_lines = 0
+        return text
+
+
+class LogTailer:
+    """
+    所有 /admin/logs/stream 连接共用的日志 tailer：
+    一个后台线程在文件变化通知到达时读取新增的完整行，再分发到每个客户端的有界队列。
+    服务端开销与连接数无关；没有连接时停止线程和文件监控
+    """
+
+    def __init__(self, path: str, config: dict):
+        self.path = os.path.abspath(path)
+        self.queue_size = config.get("CLIENT_QUEUE_SIZE", 256)
+        self.read_chunk = config.get("READ_CHUNK_BYTES", 256 * 1024)
+        self.initial_lines = config.get("INITIAL_LINES", 1000)
+        self.poll_interval = config.get("POLL_INTERVAL", 1.0)
+        self.subscribers = set()
+        self.position = 0
+        # 文件每次被截断或清空时加一
+        self.generation = 0
+        self._truncations = 0
+        self._loop = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    async def subscribe(self):
+        """
+        注册新的客户端，返回 (订阅者, 历史日志)。
+        历史日志截止到 tailer 当前读取位置，之后的内容经由队列推送，两者之间不重不漏
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            if self._thread is None:
+                self._start()
+            position = self.position
+            subscriber = LogSubscriber(self.queue_size, self.generation, position)
+            self.subscribers.add(subscriber)
+        snapshot = ""
+        if self.initial_lines and os.path.exists(self.path):
+            page = await asyncio.to_thread(read_tail, self.path, self.initial_lines, None, position)
+            snapshot = "".join(page["lines"])
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+            if not self.subscribers and self._thread is not None:
+                self._stop()
+
+    def _start(self):
+        self._truncations = truncation_state(self.path)[0]
+        self.position = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        # 每个线程使用独立的停止标志，避免快速重连时旧线程被复活
+        self._stopping = threading.Event()
+        self._wakeup.clear()
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_LogFileHandler(self.path, self._wakeup), os.path.dirname(self.path), recursive=False)
+                self._observer.start()
+            except Exception as e:
+                logger.warning(f"Log file watcher unavailable, falling back to polling: {e}")
+                self._observer = None
+        self._thread = threading.Thread(target=self._run, args=(self._stopping,), name="log-tailer", daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        self._thread = None
+
+    def _run(self, stopping: threading.Event):
+        while not stopping.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if stopping.is_set():
+                break
+            try:
+                start, text = self._read_new()
+            except Exception as e:
+                logger.debug(f"Log tailer read error: {e}")
+                continue
+            if text:
+                self._loop.call_soon_threadsafe(self._dispatch, self.generation, start, text)
+
+    def _read_new(self):
+        """
+        读取上次位置之后新增的完整行，返回 (起始偏移, 文本)；
+        文件被截断或归档清空时从当前末尾继续
+        """
+        if not os.path.exists(self.path):
+            return self.position, ""
+        chunks = []
+        truncations, truncated_size = truncation_state(self.path)
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if truncations != self._truncations:
+                # 原地截断保留的是客户端已看过的内容，从截断后的末尾继续（之后新写入的内容仍会推送）
+                self._truncations = truncations
+                self.position = min(truncated_size, size)
+                self.generation += 1
+            elif size < self.position:
+                # 没有本进程 LogRotator 记录的截断（如外部清空文件）
+                self.position = size
+                self.generation += 1
+            start = self.position
+            while self.position < size:
+                f.seek(self.position)
+                data = f.read(min(self.read_chunk, size - self.position))
+                end = data.rfind(b"\n") + 1
+                if not end:
+                    break
+                self.position += end
+                chunks.append(decode_line(data[:end]))
+                if len(data) < self.read_chunk:
+                    break
+        return start, "".join(chunks)
+
+    def _dispatch(self, generation: int, start: int, text: str):
+        # 在事件循环线程中执行
+        for subscriber in list(self.subscribers):
+            subscriber.push(generation, start, text)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "position": self.position,
+            "watching": self._observer is not None
+        }
+
+
+log_tailer = LogTailer(os.path.join(PATHS["LOGS_DIR"], "app.log"), LOG_STREAM_CONFIG)
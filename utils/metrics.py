@@ -0,0 +1,194 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 延迟直方图桶上界（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图，记录为 O(log 桶数)，分位数由桶内线性插值估算"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+
+class FunctionMetrics:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.in_flight = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # 启动预热时测得的加载、冷调用和热调用耗时（毫秒）
+        self.warmup = None
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """按函数记录调用延迟直方图、错误次数和正在执行的调用数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._functions = {}
+
+    def _get(self, function_name: str) -> FunctionMetrics:
+        metrics = self._functions.get(function_name)
+        if metrics is None:
+            metrics = self._functions[function_name] = FunctionMetrics()
+        return metrics
+
+    @contextmanager
+    def track(self, function_name: str):
+        """统计一次调用：进入时增加 in-flight，退出时记录耗时，异常时计为错误"""
+        start = self._begin(function_name)
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self._end(function_name, start, error)
+
+    async def track_stream(self, function_name: str, items):
+        """
+        包装流式调用的结果：从开始产出到流结束（或出错）都计为 in-flight，耗时覆盖整个流，
+        流中抛出的异常计为错误，客户端提前断开不计为错误
+        """
+        start = self._begin(function_name)
+        error = False
+        try:
+            async for item in items:
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self._end(function_name, start, error)
+
+    def _begin(self, function_name: str) -> float:
+        with self._lock:
+            self._get(function_name).in_flight += 1
+        return time.perf_counter()
+
+    def _end(self, function_name: str, start: float, error: bool):
+        duration = time.perf_counter() - start
+        with self._lock:
+            metrics = self._get(function_name)
+            metrics.in_flight -= 1
+            metrics.latency.observe(duration)
+            if error:
+                metrics.errors += 1
+
+    def record_cache(self, function_name: str, hit: bool):
+        with self._lock:
+            metrics = self._get(function_name)
+            if hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+
+    def record_warmup(self, function_name: str, load_ms: float, cold_ms: float = None, warm_ms: float = None):
+        with self._lock:
+            self._get(function_name).warmup = {"load_ms": load_ms, "cold_ms": cold_ms, "warm_ms": warm_ms}
+
+    def snapshot(self) -> dict:
+        """返回各函数的调用次数、错误数、in-flight 及延迟分位数（毫秒）"""
+        with self._lock:
+            result = {}
+            for name, metrics in self._functions.items():
+                latency = metrics.latency
+                result[name] = {
+                    "count": latency.count,
+                    "errors": metrics.errors,
+                    "in_flight": metrics.in_flight,
+                    "avg_ms": round(latency.sum / latency.count * 1000, 3) if latency.count else 0.0,
+                    "p50_ms": round(latency.quantile(0.5) * 1000, 3),
+                    "p95_ms": round(latency.quantile(0.95) * 1000, 3),
+                    "p99_ms": round(latency.quantile(0.99) * 1000, 3),
+                    "max_ms": round(latency.max * 1000, 3),
+                    "cache_hits": metrics.cache_hits,
+                    "cache_misses": metrics.cache_misses
+                }
+                if metrics.warmup is not None:
+                    result[name]["warmup"] = dict(metrics.warmup)
+            return result
+
+    def render_prometheus(self) -> str:
+        """以 Prometheus 文本格式输出所有指标"""
+        lines = [
+            "# HELP cloudfuse_function_duration_seconds Function invocation latency in seconds.",
+            "# TYPE cloudfuse_function_duration_seconds histogram"
+        ]
+        errors = [
+            "# HELP cloudfuse_function_errors_total Failed function invocations.",
+            "# TYPE cloudfuse_function_errors_total counter"
+        ]
+        in_flight = [
+            "# HELP cloudfuse_function_in_flight Function invocations currently running.",
+            "# TYPE cloudfuse_function_in_flight gauge"
+        ]
+        cache = [
+            "# HELP cloudfuse_function_cache_requests_total Result cache lookups by outcome.",
+            "# TYPE cloudfuse_function_cache_requests_total counter"
+        ]
+        warmup = [
+            "# HELP cloudfuse_function_warmup_seconds Startup preload timings by phase (load, cold, warm).",
+            "# TYPE cloudfuse_function_warmup_seconds gauge"
+        ]
+        with self._lock:
+            for name in sorted(self._functions):
+                metrics = self._functions[name]
+                latency = metrics.latency
+                label = f'function="{_escape_label(name)}"'
+                cumulative = 0
+                for bound, n in zip(latency.buckets, latency.counts):
+                    cumulative += n
+                    lines.append(f'cloudfuse_function_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'cloudfuse_function_duration_seconds_bucket{{{label},le="+Inf"}} {latency.count}')
+                lines.append(f'cloudfuse_function_duration_seconds_sum{{{label}}} {latency.sum}')
+                lines.append(f'cloudfuse_function_duration_seconds_count{{{label}}} {latency.count}')
+                errors.append(f'cloudfuse_function_errors_total{{{label}}} {metrics.errors}')
+                in_flight.append(f'cloudfuse_function_in_flight{{{label}}} {metrics.in_flight}')
+                if metrics.cache_hits or metrics.cache_misses:
+                    cache.append(f'cloudfuse_function_cache_requests_total{{{label},result="hit"}} {metrics.cache_hits}')
+                    cache.append(f'cloudfuse_function_cache_requests_total{{{label},result="miss"}} {metrics.cache_misses}')
+                for phase, value in (metrics.warmup or {}).items():
+                    if value is not None:
+                        warmup.append(f'cloudfuse_function_warmup_seconds{{{label},phase="{phase[:-3]}"}} {value / 1000}')
+        return "\n".join(lines + errors + in_flight + cache + warmup) + "\n"
+
+
+metrics = MetricsRegistry()
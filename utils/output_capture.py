@@ -0,0 +1,148 @@
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from config import OUTPUT_CAPTURE_CONFIG
+
+# 当前调用的输出收集器，由 PipelineStream.write 读取
+current_capture = contextvars.ContextVar("current_capture", default=None)
+
+
+class InvocationOutput:
+    """一次函数调用期间 print / logging 输出的内容，超过 max_bytes 后丢弃后续内容"""
+
+    def __init__(self, function_name: str, request_id: str, max_bytes: int, forward: bool):
+        self.function = function_name
+        self.request_id = request_id
+        self.max_bytes = max_bytes
+        self.forward = forward
+        self.started = time.time()
+        self.finished = None
+        self.status = "running"
+        self.size = 0
+        self.truncated = False
+        self.chunks = []
+        self._lock = threading.Lock()
+
+    def write(self, stream: str, text: str):
+        with self._lock:
+            if self.size >= self.max_bytes:
+                self.truncated = True
+                return
+            if self.size + len(text) > self.max_bytes:
+                text = text[:self.max_bytes - self.size]
+                self.truncated = True
+            self.size += len(text)
+            self.chunks.append((stream, text))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            chunks = list(self.chunks)
+        return {
+            "function": self.function,
+            "request_id": self.request_id,
+            "status": self.status,
+            "started": self.started,
+            "duration_ms": round(((self.finished or time.time()) - self.started) * 1000, 3),
+            "output": "".join(text for _, text in chunks),
+            "truncated": self.truncated
+        }
+
+
+class OutputCaptureStore:
+    """
+    按函数保存最近 INVOCATIONS 次调用的输出（环形缓冲）。
+    调用期间通过 contextvar 标记当前调用，sys.stdout / sys.stderr 的写入据此归属到对应调用；
+    logging 的 console handler 写 sys.stderr，因此日志记录同样会被收集
+    """
+
+    def __init__(self, config: dict):
+        self.enabled = config.get("ENABLED", True)
+        self.invocations = config.get("INVOCATIONS", 20)
+        self.max_bytes = config.get("MAX_BYTES", 64 * 1024)
+        self.forward = config.get("FORWARD_TO_LOG", False)
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def start(self, function_name: str, request_id: str = None):
+        if not self.enabled:
+            return None
+        output = InvocationOutput(function_name, request_id or uuid.uuid4().hex[:16], self.max_bytes, self.forward)
+        with self._lock:
+            buffer = self._buffers.get(function_name)
+            if buffer is None:
+                buffer = self._buffers[function_name] = deque(maxlen=self.invocations)
+            buffer.append(output)
+        return output
+
+    @contextmanager
+    def capture(self, function_name: str, request_id: str = None):
+        """在 with 块内收集当前调用的输出；流式函数的输出在流结束前会继续写入"""
+        output = self.start(function_name, request_id)
+        if output is None:
+            yield None
+            return
+        token = current_capture.set(output)
+        try:
+            yield output
+        except BaseException:
+            output.status = "error"
+            output.finished = time.time()
+            raise
+        finally:
+            current_capture.reset(token)
+            # 流式调用由 follow() 在流结束时记录状态
+            if output.status == "running":
+                output.status = "success"
+                output.finished = time.time()
+
+    def recent(self, function_name: str, n: int = None) -> list:
+        """返回函数最近 n 次调用的输出，最新的在前"""
+        with self._lock:
+            buffer = list(self._buffers.get(function_name, ()))
+        buffer.reverse()
+        if n is not None and n >= 0:
+            buffer = buffer[:n]
+        return [output.to_dict() for output in buffer]
+
+    def clear(self, function_name: str = None):
+        with self._lock:
+            if function_name is None:
+                self._buffers.clear()
+            else:
+                self._buffers.pop(function_name, None)
+
+
+def follow(output, items):
+    """
+    在收集器上下文中逐项拉取流式结果，使生成器产生的输出归属到发起调用的请求，
+    流结束时记录调用状态
+    """
+    if output is None:
+        return items
+    output.status = "streaming"
+    return _follow(output, items)
+
+
+async def _follow(output, items):
+    try:
+        while True:
+            token = current_capture.set(output)
+            try:
+                item = await items.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                current_capture.reset(token)
+            yield item
+        output.status = "success"
+    except BaseException:
+        output.status = "error"
+        raise
+    finally:
+        output.finished = time.time()
+
+
+output_capture = OutputCaptureStore(OUTPUT_CAPTURE_CONFIG)
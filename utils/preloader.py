@@ -0,0 +1,124 @@
+import time
+import asyncio
+from config import PRELOAD_CONFIG, PATHS
+from utils.logger import logger
+from utils.invoker import registry
+from utils.executor import executor
+from utils.metrics import metrics
+from utils.output_capture import output_capture
+from utils.startup_report import startup_report
+from utils.function_catalog import catalog
+
+
+def warmup_calls(preload) -> list:
+    """config.json 中 preload 字段的预热参数：true 表示只预加载，{"warmup": {...} 或 [{...}, ...]} 表示预热调用"""
+    if not isinstance(preload, dict):
+        return []
+    warmup = preload.get("warmup", [])
+    if isinstance(warmup, dict):
+        warmup = [warmup]
+    return [params for params in warmup if isinstance(params, dict)]
+
+
+class Preloader:
+    """
+    启动预加载：config.json 中设置了 preload 的函数在开始接受请求后并行导入，
+    配置了预热参数时依次执行预热调用。首个预热调用计为冷启动延迟，
+    之后以相同参数再调用一次计为热延迟，结果记录到函数指标中。
+    全部函数完成（或超时）后 /ready 才返回就绪
+    """
+
+    def __init__(self, apps_dir: str, config: dict):
+        self.apps_dir = apps_dir
+        self.concurrency = config.get("CONCURRENCY", 4)
+        self.timeout = config.get("TIMEOUT", 120)
+        self.state = "pending"
+        self.started = None
+        self.finished = None
+        self.functions = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def preload_functions(self) -> dict:
+        """从函数目录中筛选设置了 preload 的函数，返回 {函数名: 预热参数列表}"""
+        return {name: warmup_calls(config.get("preload"))
+                for name, config in catalog.configs().items() if config.get("preload")}
+
+    async def run(self):
+        self.state = "running"
+        self.started = time.time()
+        with startup_report.phase("preload", deferred=True):
+            try:
+                targets = await asyncio.to_thread(self.preload_functions)
+            except Exception as e:
+                logger.error(f"Error scanning functions to preload: {e}")
+                targets = {}
+            self.functions = {name: {"status": "pending", "warmup_calls": len(calls)} for name, calls in targets.items()}
+            semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+            async def run_one(name: str, calls: list):
+                async with semaphore:
+                    info = self.functions[name]
+                    info["status"] = "running"
+                    try:
+                        await asyncio.wait_for(self._preload(name, calls, info), self.timeout)
+                        info["status"] = "ready"
+                    except asyncio.TimeoutError:
+                        info["status"] = "error"
+                        info["error"] = f"Timed out after {self.timeout}s"
+                    except Exception as e:
+                        info["status"] = "error"
+                        info["error"] = str(getattr(e, "detail", e))
+                    if info["status"] == "error":
+                        logger.error(f"Preloading function {name} failed: {info['error']}")
+
+            await asyncio.gather(*(run_one(name, calls) for name, calls in targets.items()))
+        self.finished = time.time()
+        self.state = "ready"
+        if targets:
+            logger.info(f"Preloaded {len(targets)} functions in {(self.finished - self.started) * 1000:.0f}ms")
+
+    async def _preload(self, name: str, calls: list, info: dict):
+        start = time.perf_counter()
+        # 不同函数的导入在各自的线程中并行进行
+        await asyncio.to_thread(registry.get, name)
+        info["load_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        # 已加载，直接在事件循环中获取并计为使用中（中间没有 await），预热结束前该版本不会执行 shutdown()
+        invoker = registry.acquire(name)
+        try:
+            if calls:
+                info["cold_ms"] = await self._call(invoker, calls[0])
+                for params in calls[1:]:
+                    await self._call(invoker, params)
+                info["warm_ms"] = await self._call(invoker, calls[0])
+        finally:
+            invoker.release()
+        metrics.record_warmup(name, info["load_ms"], info.get("cold_ms"), info.get("warm_ms"))
+
+    async def _call(self, invoker, params: dict) -> float:
+        """按正常调用的执行方式执行一次预热调用（不计入调用统计和结果缓存），返回耗时（毫秒）"""
+        kwargs = invoker.bind(params)
+        start = time.perf_counter()
+        with output_capture.capture(invoker.name, "warmup"):
+            if invoker.is_stream:
+                async for _ in executor.iterate(invoker, kwargs):
+                    pass
+            else:
+                await executor.run(invoker, kwargs)
+        return round((time.perf_counter() - start) * 1000, 3)
+
+    def status(self) -> dict:
+        failed = sorted(name for name, info in self.functions.items() if info["status"] == "error")
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "started": self.started,
+            "finished": self.finished,
+            "failed": failed,
+            "functions": self.functions
+        }
+
+
+preloader = Preloader(PATHS["APPS_DIR"], PRELOAD_CONFIG)
@@ -0,0 +1,96 @@
+import time
+import threading
+from collections import OrderedDict
+from utils.logger import logger
+
+# 函数 config.json 中 cache 字段未填写时的默认值
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+class ResultCache:
+    """单个函数的结果缓存：有容量上限的 LRU，条目按 TTL 过期"""
+
+    def __init__(self, fingerprint, ttl: float, max_entries: int, key_params: list = None):
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_params = key_params
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, invoker, kwargs: dict) -> tuple:
+        """以转换后的参数（未传入的参数取默认值）构造缓存键"""
+        names = self.key_params if self.key_params is not None else [p[0] for p in invoker.plan]
+        return tuple(kwargs.get(name, invoker.defaults.get(name)) for name in names)
+
+    def get(self, key) -> tuple:
+        """返回 (是否命中, 缓存结果)，条目不存在或已过期视为未命中"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if self.ttl and expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResultCacheRegistry:
+    """
+    根据函数 config.json 中的 cache 配置管理各函数的结果缓存，例如：
+    "cache": {"enabled": true, "ttl": 60, "max_entries": 256, "key_params": ["num1", "num2"]}
+    函数代码或配置变化（调用器指纹变化）时缓存自动失效
+    """
+
+    def __init__(self):
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def for_invoker(self, invoker):
+        """返回函数的结果缓存，未启用缓存时返回 None"""
+        cache = self._caches.get(invoker.name)
+        if cache is not None and cache.fingerprint == invoker.fingerprint:
+            return cache
+        policy = invoker.config.get("cache")
+        if not isinstance(policy, dict) or not policy.get("enabled", True):
+            if cache is not None:
+                with self._lock:
+                    self._caches.pop(invoker.name, None)
+            return None
+        try:
+            cache = ResultCache(
+                invoker.fingerprint,
+                float(policy.get("ttl", DEFAULT_TTL)),
+                int(policy.get("max_entries", DEFAULT_MAX_ENTRIES)),
+                policy.get("key_params")
+            )
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid cache policy for {invoker.name}: {e}")
+            return None
+        with self._lock:
+            self._caches[invoker.name] = cache
+        return cache
+
+    def invalidate(self, function_name: str = None):
+        with self._lock:
+            if function_name is None:
+                self._caches.clear()
+            else:
+                self._caches.pop(function_name, None)
+
+
+result_caches = ResultCacheRegistry()
@@ -0,0 +1,129 @@
+import os
+import json
+import threading
+from config import PATHS
+from utils.logger import logger
+from utils.apps_watcher import apps_watcher
+
+
+class RouteTable:
+    """
+    进程内的函数路由表：路由 -> 函数名，以及函数名 -> 路由，查找为 O(1)。
+    启动时与 apps 目录对齐一次，之后由 apps 目录监控或管理接口按函数增量注册、更新、移除，
+    每次变化后原子写回 routes.txt（不再生成代码）
+    """
+
+    def __init__(self, routes_file: str, apps_dir: str):
+        self.routes_file = routes_file
+        self.apps_dir = apps_dir
+        self._routes = {}
+        self._functions = {}
+        self._lock = threading.RLock()
+
+    def _route_for(self, function_name: str):
+        """函数存在时返回其路由（config.json 中的 url，默认 /function/{函数名}），否则返回 None"""
+        function_dir = os.path.join(self.apps_dir, function_name)
+        if function_name.startswith("__") or not os.path.isfile(os.path.join(function_dir, "function.py")):
+            return None
+        route = f"/function/{function_name}"
+        try:
+            with open(os.path.join(function_dir, "config.json"), "r", encoding="utf-8") as f:
+                url = json.load(f).get("url")
+            if isinstance(url, str) and url.startswith("/"):
+                route = url
+        except (OSError, ValueError):
+            pass
+        return route
+
+    def sync(self, function_name: str) -> bool:
+        """按函数目录的当前状态注册、更新或移除该函数的路由，有变化时写回文件并返回 True"""
+        with self._lock:
+            route = self._route_for(function_name)
+            old = self._functions.get(function_name)
+            if route == old:
+                return False
+            if old is not None:
+                self._routes.pop(old, None)
+                del self._functions[function_name]
+            if route is not None:
+                owner = self._routes.get(route)
+                if owner is not None and owner != function_name:
+                    logger.warning(f"Route {route} of function {function_name} conflicts with {owner}, keeping {owner}")
+                    self._persist()
+                    return old is not None
+                self._routes[route] = function_name
+                self._functions[function_name] = route
+            self._persist()
+            return True
+
+    def rebuild(self) -> dict:
+        """与 apps 目录全量对齐（只列目录、读 config.json，不执行函数模块），返回新增和移除的路由"""
+        with self._lock:
+            # 首次对齐时与 routes.txt 中的记录比较
+            saved = self._read_file()
+            before = set(self._routes) if self._routes else set(saved)
+            names = set(self._functions)
+            if os.path.isdir(self.apps_dir):
+                names |= {item for item in os.listdir(self.apps_dir)
+                          if os.path.isdir(os.path.join(self.apps_dir, item))}
+            routes, functions = {}, {}
+            for name in sorted(names):
+                route = self._route_for(name)
+                if route is not None and route not in routes:
+                    routes[route] = name
+                    functions[name] = route
+            self._routes, self._functions = routes, functions
+            self._persist(force=saved != sorted(routes))
+            return {
+                "added": sorted(set(routes) - before),
+                "removed": sorted(before - set(routes))
+            }
+
+    def _read_file(self) -> list:
+        if not os.path.exists(self.routes_file):
+            return []
+        with open(self.routes_file, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _persist(self, force: bool = True):
+        """先写临时文件再替换，读取方不会看到写了一半的路由文件"""
+        if not force:
+            return
+        tmp_path = self.routes_file + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for route in sorted(self._routes):
+                    f.write(f"{route}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.routes_file)
+        except Exception as e:
+            logger.error(f"Error saving routes: {e}")
+
+    def start(self):
+        """启动时全量对齐一次，之后跟随 apps 目录监控增量更新"""
+        changes = self.rebuild()
+        if changes["added"] or changes["removed"]:
+            logger.info(f"Routes synced with apps directory: {changes}")
+        apps_watcher.subscribe(self._on_change)
+
+    def _on_change(self, function_name: str, file_name: str):
+        if file_name in ("", "function.py", "config.json"):
+            self.sync(function_name)
+
+    def has_function(self, function_name: str) -> bool:
+        if function_name in self._functions:
+            return True
+        # 未登记时按需检查一次（文件监控不可用或事件尚未到达）
+        self.sync(function_name)
+        return function_name in self._functions
+
+    def function_for(self, route: str):
+        return self._routes.get(route)
+
+    def routes(self) -> dict:
+        with self._lock:
+            return dict(self._routes)
+
+
+route_table = RouteTable(PATHS["ROUTES_FILE"], PATHS["APPS_DIR"])
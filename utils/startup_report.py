@@ -0,0 +1,129 @@
+import sys
+import time
+import builtins
+import threading
+from contextlib import contextmanager
+from config import STARTUP_CONFIG
+
+
+class StartupReport:
+    """
+    启动耗时报告：记录各启动阶段、模块导入（与 python -X importtime 一样区分累计耗时和自身耗时）
+    以及每个函数模块的加载耗时。导入统计通过包装 builtins.__import__ 实现，只统计首次导入，
+    延后的启动工作完成后即恢复原函数
+    """
+
+    def __init__(self, config: dict):
+        self.enabled = config.get("IMPORT_REPORT", True)
+        self.top = config.get("REPORT_TOP", 20)
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.ready_ms = None
+        self.finished_ms = None
+        self.phases = []
+        self.modules = {}
+        self.apps = {}
+        self._original_import = None
+        self._tracking = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def track_imports(self):
+        if not self.enabled or self._tracking:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+        self._tracking = True
+
+    def stop_tracking(self):
+        if self._tracking and builtins.__import__ is self._import:
+            builtins.__import__ = self._original_import
+        self._tracking = False
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if not self._tracking or level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            # 与 -X importtime 相同：累计耗时包含其导入的子模块
+            self.modules.setdefault(name, (round(total * 1000, 3), round((total - children) * 1000, 3)))
+
+    @contextmanager
+    def phase(self, name: str, deferred: bool = False):
+        """记录一个启动阶段的耗时，deferred 表示在开始接受请求之后执行"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            item = {
+                "name": name,
+                "deferred": deferred,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+            }
+            if error:
+                item["error"] = error
+            with self._lock:
+                self.phases.append(item)
+
+    def record_app(self, function_name: str, seconds: float):
+        """记录函数模块的加载耗时（首次加载和热重载都会更新）"""
+        self.apps[function_name] = {
+            "load_ms": round(seconds * 1000, 3),
+            "at_ms": self._elapsed_ms(),
+            "loads": self.apps.get(function_name, {}).get("loads", 0) + 1
+        }
+
+    def mark_ready(self):
+        """lifespan 启动完成，端口即将开始接受请求"""
+        self.ready_ms = self._elapsed_ms()
+
+    def finish(self):
+        """延后的启动工作完成：停止导入统计"""
+        self.finished_ms = self._elapsed_ms()
+        self.stop_tracking()
+
+    def slowest_modules(self, top: int = None) -> list:
+        top = self.top if top is None else top
+        items = sorted(self.modules.items(), key=lambda item: item[1][0], reverse=True)
+        return [{"module": name, "cumulative_ms": total, "self_ms": own} for name, (total, own) in items[:top]]
+
+    def summary(self) -> str:
+        modules = ", ".join(f"{item['module']} {item['cumulative_ms']:.0f}ms" for item in self.slowest_modules(5))
+        return (f"Ready to accept requests in {self.ready_ms:.0f}ms, deferred startup finished in "
+                f"{(self.finished_ms or self._elapsed_ms()):.0f}ms; slowest imports: {modules or '-'}")
+
+    def to_dict(self, top: int = None) -> dict:
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            "started": self.started,
+            "ready_ms": self.ready_ms,
+            "finished_ms": self.finished_ms,
+            "tracking_imports": self._tracking,
+            "phases": phases,
+            "modules": self.slowest_modules(top),
+            "module_count": len(self.modules),
+            "apps": dict(sorted(self.apps.items(), key=lambda item: item[1]["load_ms"], reverse=True))
+        }
+
+
+startup_report = StartupReport(STARTUP_CONFIG)
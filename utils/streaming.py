@@ -0,0 +1,47 @@
+import json
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from utils.logger import logger
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream"
+}
+
+
+def choose_format(invoker, accept: str = "") -> str:
+    """Accept 头为 text/event-stream 时使用 SSE，否则使用函数 config.json 中的 stream 配置，默认 NDJSON"""
+    if "text/event-stream" in (accept or ""):
+        return "sse"
+    fmt = invoker.config.get("stream", "ndjson")
+    return fmt if fmt in STREAM_FORMATS else "ndjson"
+
+
+def _dumps(item) -> str:
+    return json.dumps(jsonable_encoder(item), ensure_ascii=False)
+
+
+async def _encode(items, fmt: str, function_name: str):
+    try:
+        async for item in items:
+            if fmt == "sse":
+                yield f"data: {_dumps(item)}\n\n".encode("utf-8")
+            else:
+                yield (_dumps(item) + "\n").encode("utf-8")
+    except Exception as e:
+        # 响应头已发送，只能在流中报告错误
+        logger.error(f"Error streaming function {function_name}: {e}")
+        error = _dumps({"error": str(e)})
+        yield (f"event: error\ndata: {error}\n\n" if fmt == "sse" else error + "\n").encode("utf-8")
+        return
+    if fmt == "sse":
+        # 通知客户端流已结束，避免 EventSource 自动重连
+        yield b"event: end\ndata: {}\n\n"
+
+
+def stream_response(items, fmt: str, function_name: str) -> StreamingResponse:
+    """把函数产生的异步迭代器包装为 NDJSON 或 SSE 流式响应，按客户端读取速度逐项拉取"""
+    headers = {"Cache-Control": "no-cache"}
+    if fmt == "sse":
+        headers["X-Accel-Buffering"] = "no"
+    return StreamingResponse(_encode(items, fmt, function_name), media_type=STREAM_FORMATS[fmt], headers=headers)
@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from utils.logger import logger
+
+# 分钟级时间标签格式，小时/天标签分别为其前缀（与 call_stats.json 原有格式一致）
+MINUTE_FORMAT = '%Y-%m-%d-%H-%M'
+
+# 各粒度对应的标签长度：2024-01-01-08-30 / 2024-01-01-08 / 2024-01-01
+RESOLUTIONS = {
+    "minute": 16,
+    "hour": 13,
+    "day": 10
+}
+
+
+class CallHistoryStore:
+    """
+    基于 SQLite 的调用历史时序存储，按分钟/小时/天三种粒度汇总，
+    每种粒度可单独配置保留天数，查询只读取所需范围
+    """
+
+    def __init__(self, db_path: str, retention_days: dict):
+        # retention_days 中出现的粒度才会被记录，值为 None 表示永久保留
+        self.retention_days = {
+            res: days for res, days in retention_days.items() if res in RESOLUTIONS
+        }
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS call_history ("
+                " resolution TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " function TEXT NOT NULL,"
+                " count INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (resolution, bucket, function)"
+                ") WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def add(self, counts: dict):
+        """写入一批分钟级计数 {(分钟标签, 函数名): 次数}，同时累加到各粒度"""
+        rows = {}
+        for (minute, function_name), count in counts.items():
+            for res in self.retention_days:
+                key = (res, minute[:RESOLUTIONS[res]], function_name)
+                rows[key] = rows.get(key, 0) + count
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO call_history (resolution, bucket, function, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (resolution, bucket, function) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in rows.items()]
+            )
+            self._conn.commit()
+
+    def import_buckets(self, resolution: str, history: dict):
+        """导入旧版 call_stats.json 中的 history_day / history_hour 数据"""
+        rows = [
+            (resolution, bucket, function_name, count)
+            for bucket, counts in history.items() if isinstance(counts, dict)
+            for function_name, count in counts.items() if function_name != "total"
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO call_history (resolution, bucket, function, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (resolution, bucket, function) DO UPDATE SET count = count + excluded.count",
+                rows
+            )
+            self._conn.commit()
+        logger.info(f"Imported {len(rows)} legacy {resolution} call history rows")
+
+    def prune(self, now: datetime = None):
+        """按保留策略删除过期数据"""
+        now = now or datetime.now()
+        with self._lock:
+            for res, days in self.retention_days.items():
+                if not days:
+                    continue
+                cutoff = (now - timedelta(days=days)).strftime(MINUTE_FORMAT)[:RESOLUTIONS[res]]
+                self._conn.execute(
+                    "DELETE FROM call_history WHERE resolution = ? AND bucket < ?", (res, cutoff)
+                )
+            self._conn.commit()
+
+    def query(self, resolution: str, start: str = None, end: str = None, functions: list = None) -> dict:
+        """
+        查询指定粒度的调用历史。
+        start/end 为时间标签或其前缀（如 2024-01-01 或 2024-01-01-08），均包含端点；
+        functions 为空时返回所有函数。
+        返回 {时间标签: {"total": 总数, 函数名: 次数}}，只包含有数据的时间点
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        sql = "SELECT bucket, function, count FROM call_history WHERE resolution = ?"
+        args = [resolution]
+        if start:
+            sql += " AND bucket >= ?"
+            args.append(start)
+        if end:
+            # '~' 大于数字和 '-'，使前缀形式的结束标签包含其下所有更细的时间点
+            sql += " AND bucket <= ?"
+            args.append(end + "~")
+        if functions:
+            sql += f" AND function IN ({','.join('?' * len(functions))})"
+            args.extend(functions)
+        sql += " ORDER BY bucket"
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        result = {}
+        for bucket, function_name, count in rows:
+            counts = result.setdefault(bucket, {"total": 0})
+            counts["total"] += count
+            counts[function_name] = counts.get(function_name, 0) + count
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
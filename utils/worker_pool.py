@@ -0,0 +1,238 @@
+import os
+import queue
+import importlib
+import threading
+import multiprocessing
+from fastapi import HTTPException
+from config import WORKER_POOL_CONFIG, PATHS
+from utils.logger import logger
+from utils.function_catalog import catalog
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块，此时不做内存回收检查
+    resource = None
+
+
+class WorkerCallError(Exception):
+    """warm worker 中函数执行出错"""
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker_main(conn, preload_imports, preload_functions):
+    """worker 进程主循环：预加载模块后通过 Pipe 接收调用请求"""
+    from utils.invoker import registry
+
+    for module_name in preload_imports:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()} failed to preload {module_name}: {e}")
+    loaded = {}
+    for function_name in preload_functions:
+        try:
+            loaded[function_name] = registry.get(function_name).fingerprint
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()} failed to preload function {function_name}: {e}")
+    conn.send(("ready", loaded))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        function_name, kwargs = message
+        try:
+            invoker = registry.get(function_name)
+            result = invoker(**kwargs)
+            reply = ("ok", result, invoker.fingerprint)
+        except HTTPException as e:
+            reply = ("http_error", (e.status_code, e.detail), None)
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}", None)
+        try:
+            conn.send(reply + (_peak_rss_mb(),))
+        except Exception as e:
+            # 返回值无法序列化
+            conn.send(("error", f"Unpicklable result: {e}", None, _peak_rss_mb()))
+    # worker 回收或停止时释放函数在 init() 中创建的资源
+    registry.shutdown_all()
+    conn.close()
+
+
+class _Worker:
+    def __init__(self, ctx, preload_imports, preload_functions):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, preload_imports, preload_functions),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.calls = 0
+        self.rss_mb = 0.0
+        # 已加载函数及其代码指纹
+        self.loaded = {}
+
+    def wait_ready(self):
+        status, loaded = self.conn.recv()
+        self.loaded = loaded
+
+    def call(self, function_name: str, kwargs: dict):
+        self.conn.send((function_name, kwargs))
+        status, payload, fingerprint, rss_mb = self.conn.recv()
+        self.calls += 1
+        self.rss_mb = rss_mb
+        if fingerprint is not None:
+            self.loaded[function_name] = fingerprint
+        if status == "ok":
+            return payload
+        if status == "http_error":
+            raise HTTPException(status_code=payload[0], detail=payload[1])
+        raise WorkerCallError(payload)
+
+    def stop(self, timeout: float = 2):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+
+class WarmWorkerPool:
+    """
+    预先 fork 的常驻 worker 进程池。
+    worker 启动时预加载热点函数模块及其重量级依赖（pandas、numpy 等），
+    调用通过 Pipe 发送给空闲 worker；达到调用次数或内存上限、
+    或函数代码发生变化时自动替换 worker
+    """
+
+    def __init__(self, config: dict, apps_dir: str):
+        self.size = config.get("SIZE", 2)
+        self.max_calls = config.get("MAX_CALLS", 1000)
+        self.max_memory_mb = config.get("MAX_MEMORY_MB", 0)
+        self.preload_imports = list(config.get("PRELOAD_IMPORTS", []))
+        self.acquire_timeout = config.get("ACQUIRE_TIMEOUT", 30)
+        self.apps_dir = apps_dir
+        self._ctx = multiprocessing.get_context(config.get("START_METHOD"))
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._preload_functions = []
+
+    def worker_functions(self) -> list:
+        """从函数目录中筛选 config.json 中 executor 为 worker 的函数"""
+        return [name for name, config in catalog.configs().items() if config.get("executor") == "worker"]
+
+    def start(self, preload_functions: list = None):
+        with self._lock:
+            if self._started:
+                return
+            self._preload_functions = list(
+                preload_functions if preload_functions is not None else self.worker_functions()
+            )
+            workers = [self._spawn() for _ in range(self.size)]
+            for worker in workers:
+                worker.wait_ready()
+                self._idle.put(worker)
+            self._started = True
+        logger.info(f"Warm worker pool started: {self.size} workers, preloaded {self._preload_functions}")
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.preload_imports, self._preload_functions)
+        self._workers.add(worker)
+        return worker
+
+    def _replace(self, worker: _Worker):
+        """停止旧 worker 并启动一个新的 warm worker 放回空闲队列"""
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+        self._respawn()
+
+    def _respawn(self):
+        if not self._started:
+            return
+        with self._lock:
+            worker = self._spawn()
+        try:
+            worker.wait_ready()
+        except Exception as e:
+            logger.error(f"Warm worker failed to start: {e}")
+            with self._lock:
+                self._workers.discard(worker)
+            worker.stop()
+            # 避免池中可用 worker 数量减少，稍后重试
+            threading.Timer(1, self._respawn).start()
+            return
+        self._idle.put(worker)
+
+    def _needs_recycle(self, worker: _Worker) -> bool:
+        if self.max_calls and worker.calls >= self.max_calls:
+            return True
+        return bool(self.max_memory_mb) and worker.rss_mb > self.max_memory_mb
+
+    def call(self, function_name: str, kwargs: dict, fingerprint=None):
+        """阻塞调用，应在线程池中执行"""
+        if not self._started:
+            self.start()
+        try:
+            # 所有 worker 都忙（或正在重启）时不无限等待，避免占满执行线程池
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise HTTPException(status_code=503,
+                                detail=f"No warm worker available for {function_name} within {self.acquire_timeout}s")
+        # 函数代码已变化：透明地换一个全新的 worker 再执行
+        loaded = worker.loaded.get(function_name)
+        if fingerprint is not None and loaded is not None and loaded != fingerprint:
+            logger.info(f"Code of {function_name} changed, restarting warm worker")
+            with self._lock:
+                self._workers.discard(worker)
+                new_worker = self._spawn()
+            worker.stop()
+            new_worker.wait_ready()
+            worker = new_worker
+        try:
+            result = worker.call(function_name, kwargs)
+        except (EOFError, OSError, BrokenPipeError) as e:
+            # worker 进程意外退出
+            threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+            raise WorkerCallError(f"Warm worker crashed: {e}")
+        except BaseException:
+            self._release(worker)
+            raise
+        self._release(worker)
+        return result
+
+    def _release(self, worker: _Worker):
+        if self._needs_recycle(worker):
+            threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+        else:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            self._started = False
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+
+worker_pool = WarmWorkerPool(WORKER_POOL_CONFIG, PATHS["APPS_DIR"])